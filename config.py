@@ -1,7 +1,31 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+def _load_env_file(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')):
+    """
+    Read KEY=value lines from .env into os.environ without overriding variables already set.
+    Blank lines, # comments and an 'export ' prefix are ignored; values may be quoted.
+    """
+    try:
+        with open(path, 'rb') as f:
+            lines = f.read().decode('utf-8').splitlines()
+    except OSError:
+        return
+    
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        if line.startswith('export '):
+            line = line[len('export '):]
+        key, value = line.split('=', 1)
+        key, value = key.strip(), value.strip()
+        if value[:1] in ('"', "'") and value.endswith(value[0]) and len(value) > 1:
+            value = value[1:-1]
+        else:
+            value = value.split(' #', 1)[0].rstrip()  # Inline comment after an unquoted value
+        os.environ.setdefault(key, value)
+
+_load_env_file()
 
 class Config:
     # API Configuration
@@ -35,6 +59,11 @@ class Config:
     ENABLE_UPLOAD_CLEANUP = True
     UPLOAD_CLEANUP_AGE_HOURS = 1  # Remove files older than 1 hour (more aggressive cleanup)
     
+    # Disk Cache Configuration - off unless DIXII_CACHE_DIR is set, since entries hold taxpayer data
+    DISK_CACHE_DIR = os.getenv('DIXII_CACHE_DIR') or None
+    DISK_CACHE_MAX_AGE_HOURS = 24  # Upload cleanup also prunes to UPLOAD_CLEANUP_AGE_HOURS
+    DISK_CACHE_MAX_MB = 512        # Per cache directory
+    
     # Session Cleanup Configuration
     ENABLE_SESSION_CLEANUP = True
     SESSION_CLEANUP_AGE_HOURS = 2  # Remove completed/error sessions older than 2 hours
@@ -48,13 +48,13 @@ def download_model():
 
 if __name__ == "__main__":
     # Check if model already exists
-    if os.path.exists("donut-irs-tax-docs-classifier"):
+    if os.path.isdir("donut-irs-tax-docs-classifier"):
         print("✅ Donut model already exists!")
         print("📁 Location: donut-irs-tax-docs-classifier/")
         
         # Check if it has the required files
         required_files = ["config.json", "model.safetensors", "tokenizer.json"]
-        missing_files = [f for f in required_files if not os.path.exists(f"donut-irs-tax-docs-classifier/{f}")]
+        missing_files = [f for f in required_files if not os.path.isfile(f"donut-irs-tax-docs-classifier/{f}")]
         
         if missing_files:
             print(f"⚠️  Warning: Missing files: {missing_files}")
@@ -3,6 +3,7 @@ from transformers import DonutSwinModel, DonutSwinPreTrainedModel, DonutProcesso
 from torch import nn
 from PIL import Image
 import os
+import threading
 
 class DonutForImageClassification(DonutSwinPreTrainedModel):
     def __init__(self, config):
@@ -25,6 +26,13 @@ class DonutTaxClassifier:
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.processor = None
         self.model = None
+        
+        # CUDA graph state (GPU only) - inputs always have the same shape
+        self._graph = None
+        self._static_input = None
+        self._static_output = None
+        self._graph_lock = threading.Lock()
+        
         self._load_model()
     
     def _load_model(self):
@@ -39,6 +47,51 @@ class DonutTaxClassifier:
             print(f"Error loading donut model: {e}")
             self.processor = None
             self.model = None
+            return
+        
+        self._capture_cuda_graph()
+    
+    def _capture_cuda_graph(self):
+        """Capture the fixed-shape forward pass as a CUDA graph (eager fallback on CPU or failure)"""
+        if self.device != 'cuda':
+            return
+        
+        try:
+            # Every page is resized to the same size, so one static input buffer serves all calls
+            blank = Image.new('RGB', (1920, 2560), 'white')
+            sample = self.processor(blank, return_tensors="pt", legacy=False).pixel_values
+            self._static_input = sample.to(self.device)
+            
+            with torch.no_grad():
+                # Warm up on a side stream before capture, as CUDA graphs require
+                stream = torch.cuda.Stream()
+                stream.wait_stream(torch.cuda.current_stream())
+                with torch.cuda.stream(stream):
+                    for _ in range(3):
+                        self.model(self._static_input)
+                torch.cuda.current_stream().wait_stream(stream)
+                
+                graph = torch.cuda.CUDAGraph()
+                with torch.cuda.graph(graph):
+                    self._static_output = self.model(self._static_input)
+            
+            self._graph = graph
+            print("Donut CUDA graph captured")
+        except Exception as e:
+            print(f"CUDA graph capture failed, using eager inference: {e}")
+            self._graph = None
+            self._static_input = None
+            self._static_output = None
+    
+    def _forward(self, pixel_values):
+        """Run the model, replaying the captured CUDA graph when the input shape matches"""
+        if self._graph is not None and pixel_values.shape == self._static_input.shape:
+            with self._graph_lock:
+                self._static_input.copy_(pixel_values)
+                self._graph.replay()
+                return self._static_output.clone()
+        
+        return self.model(pixel_values.to(self.device))
     
     def classify_document(self, image_path):
         """
@@ -54,23 +107,26 @@ class DonutTaxClassifier:
             if file_ext == '.pdf':
                 # Convert PDF to image for Donut model
                 import pdf2image
-                images = pdf2image.convert_from_path(image_path, dpi=300)
+                images = pdf2image.convert_from_path(image_path, dpi=300, first_page=1, last_page=1)
                 if not images:
                     return None, 0.0
                 
                 # Use first page for classification
                 img = images[0]
-                img_resized = img.resize((1920, 2560), Image.Resampling.LANCZOS)
             else:
-                # Load and resize image
+                # Load image once; convert decodes it so resize works on RGB pixels
                 img = Image.open(image_path)
-                img_resized = img.resize((1920, 2560), Image.Resampling.LANCZOS)
+            
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            
+            # BILINEAR is plenty for a Swin classifier on downscales this large
+            img_resized = img.resize((1920, 2560), Image.Resampling.BILINEAR)
             
             # Perform inference
             with torch.no_grad():
-                pixel_values = self.processor(img_resized.convert("RGB"), return_tensors="pt", legacy=False).pixel_values
-                pixel_values = pixel_values.to(self.device)
-                outputs = self.model(pixel_values)
+                pixel_values = self.processor(img_resized, return_tensors="pt", legacy=False).pixel_values
+                outputs = self._forward(pixel_values)
                 
                 # Get prediction
                 probabilities = torch.nn.functional.softmax(outputs, dim=-1)
@@ -1,17 +1,546 @@
 import anthropic
 import base64
 import os
-from PIL import Image
+from PIL import Image, ImageChops, ImageOps, ImageStat
 import io
-import re
 import json
+import re
 import logging
+import time
+import asyncio
+import threading
+import importlib.util
+import hashlib
+import copy
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+import atexit
+import httpx
+from utils.disk_cache import cache_dir, write_cache_file
+
+try:
+    import ahocorasick  # optional: single-pass multi-keyword matching for entity detection
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson  # optional: 2-5x faster JSON parsing of API responses and cache entries
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import turbojpeg  # optional: DCT-scaled JPEG decoding through libjpeg-turbo
+except ImportError:
+    turbojpeg = None
+
+# Parsed response cache: in-memory LRU in front of an optional on-disk store (see utils.disk_cache;
+# None when Config.DISK_CACHE_DIR is unset), so re-uploads and re-runs of an already-seen page
+# never reach the API.
+# Bump when prompts or response parsing change in a way that should invalidate cached responses
+RESPONSE_CACHE_DIR = cache_dir('extractions')
+RESPONSE_CACHE_VERSION = 2
+RESPONSE_CACHE_SIZE = 256
+
+# Encoded page cache: in-memory LRU in front of an optional on-disk store that survives restarts
+# (see utils.disk_cache; None when Config.DISK_CACHE_DIR is unset).
+# Bump IMAGE_ENCODING_VERSION whenever _encode_image output changes (size, format, quality).
+IMAGE_CACHE_DIR = cache_dir('ocr_b64')
+IMAGE_CACHE_SIZE = 128
+IMAGE_ENCODING_VERSION = 8
+
+# Mean |R-G| / |G-B| (0-255) below which a page counts as black-on-white and, on the JPEG
+# fallback, is sent greyscale
+GREYSCALE_CHROMA_THRESHOLD = 4.0
+
+# Requests that reference uploaded pages by file_id need the Files API beta
+FILES_API_HEADERS = {"anthropic-beta": "files-api-2025-04-14"}
+
+# Upper bound on Claude requests in flight from extract_many, across all threads using one instance
+MAX_CONCURRENT_REQUESTS = 8
+
+# Output budget for the combined identify-and-extract prompt
+IDENTIFY_AND_EXTRACT_MAX_TOKENS = 700
+
+# Connection pool settings for Anthropic API clients (sync and async)
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=10.0)
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None  # HTTP/2 needs the optional 'h2' package
+
+# One keep-alive connection pool shared by every EnhancedClaudeOCR in the process,
+# so sequential and concurrent API calls reuse warm TLS connections
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def _get_shared_http_client():
+    """Return the process-wide httpx client used for Anthropic API calls"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        return _http_client
+
+# Static prompts live at module level so they are built once, and so the response cache key
+# (see _response_cache_key) is stable across calls
+IDENTIFY_AND_EXTRACT_PROMPT = """
+        Analyze this tax document in a single pass.
+        
+        STEP 1 - IDENTIFY:
+        1. DOCUMENT TYPE: What specific tax form is this? Look for form numbers and titles
+           (Form 1040, Form W-2, Form 1099-NEC/MISC/INT/DIV/R/etc., Schedule K-1, Form 1098/1098-E/1098-T,
+           Form W-9, state tax forms, property tax statements, bank/investment statements).
+        2. TAX YEAR: What tax year does this document relate to?
+        3. AMENDMENT STATUS: Is this an amended, corrected, or superseded document?
+        4. PRIMARY ENTITY: Who is the main subject/recipient of this document?
+        
+        STEP 2 - EXTRACT the fields for the matching form group ONLY (omit the other groups).
+        Give person names as FIRST and LAST name separately.
+        
+        If Schedule K-1 (issuer is the partnership/entity, recipient is the partner/shareholder):
+            "partnership_name", "partnership_ein", "partnership_address",
+            "form_source" (1065/1120S/1041), "entity_type" (Partnership/S Corporation/Trust/Estate),
+            "partner_first_name", "partner_last_name", "partner_percentage",
+            "partner_type" (General Partner/Limited Partner/Shareholder/Beneficiary), "is_final_k1" (true/false)
+        If Form 1099 (payer paid the recipient):
+            "form_type" (1099-XXX), "payer_name", "payer_address",
+            "recipient_first_name", "recipient_last_name", "recipient_business_name" (if not an individual),
+            "payment_type", "is_corrected" (true/false)
+        If Form W-2:
+            "employer_name", "employer_address", "employee_first_name", "employee_last_name",
+            "employee_address", "control_number", "copy_designation"
+        If Form 1098:
+            "form_type" (1098-XXX or 1098), "lender_name", "lender_address",
+            "borrower_first_name", "borrower_last_name", "property_address", "account_number"
+        If Form 1040:
+            "primary_first_name", "primary_last_name", "spouse_first_name", "spouse_last_name",
+            "filing_status", "form_type" (1040 variant), "is_joint_return" (true/false), "state" (state code)
+        Otherwise (any other document):
+            "person_first_name", "person_last_name", "business_name", "document_title",
+            "year", "reference_number"
+        
+        Use null for anything not present. Return ONLY one flat JSON object:
+        {
+            "document_type": "exact form name/type",
+            "tax_year": "YYYY or null",
+            "is_amended": true/false,
+            "amendment_type": "AMENDED/CORRECTED/SUPERSEDED or null",
+            "primary_entity_name": "name of primary person/entity or null",
+            ...the form-specific fields from STEP 2...
+        }
+        """
+
+# Per-form extraction schemas: field name -> terse descriptor. Sent as compact JSON, which
+# costs far fewer input tokens than describing each field in prose.
+K1_SCHEMA = {
+    "partnership_name": "issuing partnership/entity name",
+    "partnership_ein": "issuer EIN",
+    "partnership_address": "issuer address",
+    "form_source": "1065/1120S/1041",
+    "entity_type": "Partnership/S Corporation/Trust/Estate",
+    "partner_first_name": "recipient partner/shareholder first name",
+    "partner_last_name": "recipient partner/shareholder last name",
+    "partner_percentage": "partner share percentage",
+    "partner_type": "General Partner/Limited Partner/Shareholder/Beneficiary",
+    "is_final_k1": "true if Final K-1 box checked, else false",
+    "tax_year": "YYYY"
+}
+
+FORM_1099_SCHEMA = {
+    "form_type": "1099-XXX (NEC/MISC/INT/DIV/R/...)",
+    "payer_name": "payer business/organization name",
+    "payer_address": "payer address",
+    "recipient_first_name": "recipient first name if an individual",
+    "recipient_last_name": "recipient last name if an individual",
+    "recipient_business_name": "recipient business name if not an individual",
+    "payment_type": "type of service/payment",
+    "tax_year": "YYYY",
+    "is_corrected": "true if CORRECTED box checked, else false"
+}
+
+W2_SCHEMA = {
+    "employer_name": "employer name",
+    "employer_address": "employer address",
+    "employee_first_name": "employee first name",
+    "employee_last_name": "employee last name",
+    "employee_address": "employee address",
+    "tax_year": "YYYY",
+    "control_number": "box d control number",
+    "copy_designation": "Copy A/B/C/..."
+}
+
+FORM_1098_SCHEMA = {
+    "form_type": "1098 or 1098-XXX (E/T/...)",
+    "lender_name": "lender/institution name",
+    "lender_address": "lender address",
+    "borrower_first_name": "borrower/student first name",
+    "borrower_last_name": "borrower/student last name",
+    "property_address": "mortgaged property address",
+    "account_number": "account number",
+    "tax_year": "YYYY"
+}
+
+FORM_1040_SCHEMA = {
+    "primary_first_name": "primary taxpayer first name",
+    "primary_last_name": "primary taxpayer last name",
+    "spouse_first_name": "spouse first name if joint",
+    "spouse_last_name": "spouse last name if joint",
+    "filing_status": "Single/Married Filing Jointly/...",
+    "form_type": "1040 variant (1040/1040-SR/1040NR/1040-X/...)",
+    "tax_year": "YYYY",
+    "is_joint_return": "true/false",
+    "state": "state code if a state return"
+}
+
+GENERIC_SCHEMA = {
+    "person_first_name": "any person's first name",
+    "person_last_name": "any person's last name",
+    "business_name": "any business/organization name",
+    "document_title": "document type/title",
+    "year": "YYYY",
+    "reference_number": "account or reference number"
+}
+
+def _schema_prompt(form, schema):
+    """Build a compact single-line extraction prompt for one form schema"""
+    return (f"Extract from this {form} document. Respond ONLY with one JSON object matching: "
+            f"{json.dumps(schema, separators=(',', ':'))}. Unknown fields -> null.")
+
+K1_EXTRACTION_PROMPT = _schema_prompt("Schedule K-1", K1_SCHEMA)
+FORM_1099_EXTRACTION_PROMPT = _schema_prompt("Form 1099", FORM_1099_SCHEMA)
+W2_EXTRACTION_PROMPT = _schema_prompt("Form W-2", W2_SCHEMA)
+FORM_1098_EXTRACTION_PROMPT = _schema_prompt("Form 1098", FORM_1098_SCHEMA)
+FORM_1040_EXTRACTION_PROMPT = _schema_prompt("Form 1040", FORM_1040_SCHEMA)
+GENERIC_EXTRACTION_PROMPT = _schema_prompt("tax-related", GENERIC_SCHEMA)
+
+def _schema_tool(name, schema):
+    """
+    Build a tool whose input_schema is the form schema. Forcing Claude to call it makes the
+    API return the fields as an already-parsed dict instead of free text to be parsed.
+    """
+    properties = {
+        field: {"type": ["boolean", "null"] if field.startswith('is_') else ["string", "null"],
+                "description": descriptor}
+        for field, descriptor in schema.items()
+    }
+    return {
+        "name": name,
+        "description": "Record the fields extracted from the document. Use null for unknown fields.",
+        "input_schema": {"type": "object", "properties": properties, "required": list(schema)}
+    }
+
+K1_TOOL = _schema_tool("extract_k1", K1_SCHEMA)
+FORM_1099_TOOL = _schema_tool("extract_1099", FORM_1099_SCHEMA)
+W2_TOOL = _schema_tool("extract_w2", W2_SCHEMA)
+FORM_1098_TOOL = _schema_tool("extract_1098", FORM_1098_SCHEMA)
+FORM_1040_TOOL = _schema_tool("extract_1040", FORM_1040_SCHEMA)
+GENERIC_TOOL = _schema_tool("extract_generic", GENERIC_SCHEMA)
+
+# Known forms, keyed by canonical document type -> (schema, extraction prompt, extraction tool,
+# max_tokens). max_tokens is sized to the schema (~8 tokens per field plus values, plus the
+# tool_use wrapper) so a runaway answer is cut short instead of decoded to 500 tokens; an answer
+# that does hit it is retried once with twice the budget (see _request_json).
+# Anything _canonicalize_doc_type does not recognise uses GENERIC_FORM_TYPE.
+FORM_TYPES = {
+    'K1': (K1_SCHEMA, K1_EXTRACTION_PROMPT, K1_TOOL, 400),
+    '1099': (FORM_1099_SCHEMA, FORM_1099_EXTRACTION_PROMPT, FORM_1099_TOOL, 300),
+    'W2': (W2_SCHEMA, W2_EXTRACTION_PROMPT, W2_TOOL, 300),
+    '1098': (FORM_1098_SCHEMA, FORM_1098_EXTRACTION_PROMPT, FORM_1098_TOOL, 300),
+    '1040': (FORM_1040_SCHEMA, FORM_1040_EXTRACTION_PROMPT, FORM_1040_TOOL, 300),
+}
+GENERIC_FORM_TYPE = (GENERIC_SCHEMA, GENERIC_EXTRACTION_PROMPT, GENERIC_TOOL, 300)
+
+# Generational suffixes that can trail a person's name
+NAME_SUFFIXES = frozenset({'JR', 'SR', 'II', 'III', 'IV'})
+
+DOC_TYPE_RE = re.compile(r'\b(K-?1|1099|W-?2|1098|1040)(?!\d)')
+
+@lru_cache(maxsize=256)
+def _canonicalize_doc_type(document_type):
+    """Map a free-form document_type to a FORM_TYPES key ('K1', '1099', 'W2', ...), or None"""
+    match = DOC_TYPE_RE.search((document_type or '').upper())
+    return match.group(1).replace('-', '') if match else None
+
+def _form_type(document_type):
+    """Return (schema, extraction prompt, extraction tool, max_tokens) for a document_type string"""
+    return FORM_TYPES.get(_canonicalize_doc_type(document_type), GENERIC_FORM_TYPE)
+
+@lru_cache(maxsize=256)
+def _confidence_weights(document_type):
+    """
+    Equal weights over the fields expected for this document type, summing to 1, as a tuple
+    of (field, weight) pairs. is_* flags are excluded - false is a valid answer, not a missing one.
+    """
+    schema = _form_type(document_type)[0]
+    fields = ['primary_entity_name'] + [f for f in schema if not f.startswith('is_')]
+    return tuple((field, 1.0 / len(fields)) for field in fields)
+
+VALIDATION_PROMPT_TEMPLATE = """
+        VALIDATION TASK: Review this tax document and verify the extracted information.
+        
+        Previously extracted data:
+        - Document Type: {doc_type}
+        - Client/Person Name: {client_name}
+        - Tax Year: {tax_year}
+        
+        Instructions:
+        1. Look at the document image carefully
+        2. Verify if each extracted field is CORRECT
+        3. If you find errors, provide the CORRECT values
+        4. Rate your confidence (0.0 to 1.0) for each field
+        5. Focus on accuracy - double-check names, years, and form types
+        
+        Return ONLY this JSON format:
+        {{
+            "document_type_correct": true/false,
+            "corrected_document_type": "correct form name if wrong, or null",
+            "client_name_correct": true/false, 
+            "corrected_client_name": "correct name if wrong, or null",
+            "tax_year_correct": true/false,
+            "corrected_tax_year": "YYYY if wrong, or null",
+            "validation_confidence": 0.0-1.0,
+            "validation_notes": "brief explanation of any corrections"
+        }}
+        """
+
+# libjpeg-turbo handle, created on first JPEG (False once it turned out to be unavailable)
+_turbojpeg = None
+_turbojpeg_lock = threading.Lock()
+
+def _get_turbojpeg():
+    """Return the process-wide TurboJPEG instance, or None if PyTurboJPEG or libturbojpeg is missing"""
+    global _turbojpeg
+    with _turbojpeg_lock:
+        if _turbojpeg is None:
+            try:
+                _turbojpeg = turbojpeg.TurboJPEG() if turbojpeg is not None else False
+            except Exception:
+                # The Python package is installed but the shared library is not
+                _turbojpeg = False
+        return _turbojpeg or None
+
+def _decode_jpeg_scaled(jpeg_bytes, max_size):
+    """
+    Decode a JPEG with libjpeg-turbo at the smallest n/8 scale that still covers max_size,
+    so the full-resolution pixel buffer is never built. Returns a PIL image, or None if
+    TurboJPEG is unavailable or cannot read the file (callers then fall back to PIL).
+    """
+    tj = _get_turbojpeg()
+    if tj is None:
+        return None
+    try:
+        width, height = tj.decode_header(jpeg_bytes)[:2]
+        longest = max(width, height)
+        # Downscales only (libjpeg-turbo also offers up to 2x); 1/1 when already small enough
+        scaling_factor = min(
+            (factor for factor in tj.scaling_factors
+             if factor[0] <= factor[1] and longest * factor[0] >= max_size[0] * factor[1]),
+            key=lambda factor: factor[0] / factor[1],
+            default=(1, 1)
+        )
+        pixels = tj.decode(jpeg_bytes, pixel_format=turbojpeg.TJPF_RGB, scaling_factor=scaling_factor)
+        return Image.fromarray(pixels)
+    except Exception:
+        return None
+
+def _is_near_greyscale(img):
+    """Whether an RGB(A) image carries essentially no colour, judged on a 64x64 sample"""
+    sample = img.convert('RGB').resize((64, 64), Image.Resampling.NEAREST)
+    red, green, blue = sample.split()
+    return all(ImageStat.Stat(ImageChops.difference(a, b)).mean[0] < GREYSCALE_CHROMA_THRESHOLD
+               for a, b in ((red, green), (green, blue)))
+
+def _encode_image_file(image_path, max_size, preprocess, greyscale=False):
+    """
+    Render/load, downscale and encode an image or PDF page to base64 (uncached, None if the
+    PDF has no pages). Module-level so ProcessPoolExecutor workers can run it.
+    """
+    # Handle PDFs by converting to image
+    file_ext = os.path.splitext(image_path)[1].lower()
+    if file_ext == '.pdf':
+        # Convert PDF to image for Claude processing
+        import pdf2image
+        # 200 dpi is already well above what survives the downscale below
+        images = pdf2image.convert_from_path(image_path, dpi=200, first_page=1, last_page=1)
+        if not images:
+            return None
+        
+        # Use first page for processing
+        img = images[0]
+    else:
+        img = None
+        with open(image_path, 'rb') as f:
+            if f.read(2) == b'\xff\xd8':
+                # JPEG by magic bytes - decode at reduced scale with libjpeg-turbo when available
+                f.seek(0)
+                img = _decode_jpeg_scaled(f.read(), max_size)
+        
+        if img is None:
+            # Load image directly
+            img = Image.open(image_path)
+            if img.format == 'JPEG':
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below max size),
+                # so large phone photos are not fully decoded just to be downscaled
+                img.draft('RGB', max_size)
+    
+    # Palette/bitonal/CMYK images are converted up front; modes the resamplers handle natively
+    # are converted after the downscale, so no full-resolution RGB copy is ever made
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        img = img.convert('RGB')
+    
+    # Resize image if too large (Claude has size limits)
+    # Cheap integer box-reduce first so the filter only handles the final < 2x step,
+    # where BILINEAR is visually indistinguishable from LANCZOS and several times cheaper
+    factor = max(img.size) // max_size[0]
+    if factor > 1:
+        img = img.reduce(factor)
+    img.thumbnail(max_size, Image.Resampling.BILINEAR)
+    
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    
+    # Done after the downscale so it only touches the final pixels
+    if preprocess:
+        img = ImageOps.autocontrast(img, cutoff=1)
+    
+    # Convert to base64 - WebP is ~30% smaller than JPEG at equal fidelity
+    buffer = io.BytesIO()
+    try:
+        img.save(buffer, format='WEBP', quality=80, method=4)
+    except (KeyError, OSError):
+        # Pillow built without WebP support. WebP has no single-plane mode, but JPEG does, so
+        # monochrome pages drop their chroma planes here
+        if greyscale and _is_near_greyscale(img):
+            img = img.convert('L')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=85, optimize=True, progressive=False, subsampling=2)
+    # getbuffer() hands b64encode the bytes without copying them; base64 output is pure ASCII
+    return base64.b64encode(buffer.getbuffer()).decode('ascii')
+
+def _parse_json_response(content):
+    """Extract the JSON object from a Claude text response ({} if there is none)"""
+    content = content.strip()
+    if content.startswith('```'):
+        # Markdown code fence around the object
+        content = content.removeprefix('```json').removeprefix('```').removesuffix('```').strip()
+    
+    # Fast path: asked to "Return ONLY JSON", Claude almost always does
+    try:
+        result = _json_loads(content)
+        if isinstance(result, dict):
+            return result
+    except ValueError:  # json and orjson decode errors both subclass ValueError
+        pass
+    
+    # Fallback: single linear scan from the first '{' to its matching '}'
+    start = content.find('{')
+    end = _find_json_object_end(content, start)
+    if end == -1:
+        return {}
+    return _json_loads(content[start:end + 1])
+
+def _find_json_object_end(content, start):
+    """
+    Index of the '}' closing the object that opens at start (-1 if start is -1 or it never closes).
+    Braces inside JSON strings - e.g. a name or note containing '}' - are skipped, as are escaped quotes.
+    """
+    if start == -1:
+        return -1
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(content)):
+        char = content[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+def _first_truthy(result, keys):
+    """Value of the first key in keys that is set to something truthy in result, else None"""
+    return next((result[key] for key in keys if result.get(key)), None)
+
+def _is_whole_word(text, start, end):
+    """Whether text[start:end] is not joined to a word character on either side"""
+    return ((start == 0 or not (text[start - 1].isalnum() or text[start - 1] == '_'))
+            and (end == len(text) or not (text[end].isalnum() or text[end] == '_')))
+
+def _message_json(message):
+    """Return the dict from a forced tool call, or parse the JSON out of a text answer"""
+    for block in message.content:
+        if block.type == 'tool_use':
+            return dict(block.input)
+    return _parse_json_response(message.content[0].text) if message.content else {}
 
 class EnhancedClaudeOCR:
+    # Name fields across the per-form extraction schemas, highest priority first
+    _FIRST_NAME_FIELDS = ('partner_first_name', 'recipient_first_name', 'employee_first_name',
+                          'borrower_first_name', 'primary_first_name', 'person_first_name')
+    _LAST_NAME_FIELDS = ('partner_last_name', 'recipient_last_name', 'employee_last_name',
+                         'borrower_last_name', 'primary_last_name', 'person_last_name')
+    
     def __init__(self, api_key):
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = anthropic.Anthropic(api_key=api_key, http_client=_get_shared_http_client())
         self.logger = logging.getLogger(__name__)
         
+        # LRU cache of parsed API responses (see _response_cache_key), backed by RESPONSE_CACHE_DIR
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+        
+        # Combined identify-and-extract answers scoring below this get a form-specific
+        # follow-up extraction
+        self.early_exit_threshold = 0.85
+        
+        self.extract_model = "claude-3-5-sonnet-20241022"
+        
+        # Longest side sent to Claude; vision tokens scale with pixel count, and 1024px is
+        # enough for form numbers and typed text. Raise it for low-quality scans.
+        self.image_max_size = (1024, 1024)
+        
+        # Dense, small-print forms whose form-specific follow-up (only sent when the first answer
+        # was incomplete) gets a larger page; 1568px is the most Claude uses without downscaling
+        self.high_detail_types = ('K1', '1040')
+        self.high_detail_max_size = (1568, 1568)
+        
+        # Cheap contrast stretch before encoding - lifts first-pass confidence on faded scans,
+        # which keeps more documents out of the validation pass
+        self.preprocess_images = True
+        
+        # When WebP is unavailable, send near-greyscale pages (most printed tax forms) as
+        # single-plane JPEGs. Turn off if colour-coded boxes matter for the documents being processed
+        self.greyscale_images = True
+        
+        # LRU cache of encoded pages keyed by file identity (see _image_cache_key)
+        self._image_cache = OrderedDict()
+        self._image_cache_lock = threading.Lock()
+        
+        # Upload each encoded page once through the Files API and reference it by file_id, instead
+        # of re-sending ~33%-inflated base64 in every identification/extraction/validation request.
+        # Off by default while the Files API is in beta.
+        self.use_files_api = False
+        self._file_ids = OrderedDict()  # page content hash -> file_id, LRU
+        self._file_ids_lock = threading.Lock()
+        
+        # Shared by every extract_many call so concurrent callers together stay under the rate limit
+        self._request_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+        
+        # Worker processes for batch encoding, started on first use (see _preprocess_many)
+        self._image_pool = None
+        self._image_pool_lock = threading.Lock()
+        
         # Configuration for amendment and correction indicators
         self.amendment_indicators = [
             'AMENDED', 'CORRECTED', 'SUPERSEDED', 'REVISED', 'SUBSTITUTE',
@@ -27,74 +556,253 @@ class EnhancedClaudeOCR:
             'Estate': ['ESTATE', 'EST'],
             'S-Corp': ['S CORP', 'S-CORP', 'S CORPORATION']
         }
+        self._build_entity_matchers()
     
-    def image_to_base64(self, image_path):
-        """Convert image or PDF to base64 for Claude API with optimization"""
+    def image_to_base64(self, image_path, max_size=None):
+        """
+        Convert image or PDF to base64 for Claude API with optimization.
+        max_size overrides image_max_size (see high_detail_max_size).
+        Results are cached in memory and on disk by file identity, so a file that is
+        encoded again (validation passes, retries, re-runs) skips PDF rendering and re-encoding.
+        """
+        max_size = max_size or self.image_max_size
         try:
-            # Handle PDFs by converting to image
-            file_ext = os.path.splitext(image_path)[1].lower()
-            if file_ext == '.pdf':
-                # Convert PDF to image for Claude processing
-                import pdf2image
-                images = pdf2image.convert_from_path(image_path, dpi=300)
-                if not images:
-                    return None
-                
-                # Use first page for processing
-                img = images[0]
-            else:
-                # Load image directly
-                img = Image.open(image_path)
-            
-            # Convert to RGB if necessary
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Resize image if too large (Claude has size limits)
-            max_size = (1568, 1568)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Convert to base64
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=90)
-            img_data = buffer.getvalue()
-            return base64.b64encode(img_data).decode('utf-8')
+            cache_key = self._image_cache_key(image_path, max_size)
+        except OSError as e:
+            self.logger.error(f"Error converting image/PDF to base64: {e}")
+            return None
+        
+        img_base64 = self._get_cached_image(cache_key)
+        if img_base64 is None:
+            img_base64 = self._encode_image(image_path, max_size)
+            if img_base64:
+                self._store_cached_image(cache_key, img_base64)
+        
+        return img_base64
+    
+    def clear_image_cache(self, disk=False):
+        """
+        Drop cached encoded pages, e.g. to release memory in a long-running worker.
+        disk=True also deletes the on-disk store in IMAGE_CACHE_DIR (shared with other processes).
+        """
+        with self._image_cache_lock:
+            self._image_cache.clear()
+        
+        if disk and IMAGE_CACHE_DIR is not None:
+            try:
+                with os.scandir(IMAGE_CACHE_DIR) as entries:
+                    for entry in entries:
+                        if entry.name.endswith('.b64'):
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                pass
+            except OSError as e:
+                self.logger.debug(f"Could not clear image cache directory {IMAGE_CACHE_DIR}: {e}")
+    
+    def _preprocess_many(self, image_paths):
+        """
+        Encode many files at once, spreading cache misses over worker processes - PIL resizing
+        and encoding hold the GIL, so threads would run them one at a time.
+        Returns: dict mapping each image path to its base64 string (None on failure)
+        """
+        encoded = {}
+        misses = {}
+        for image_path in image_paths:
+            try:
+                cache_key = self._image_cache_key(image_path)
+            except OSError as e:
+                self.logger.error(f"Error converting image/PDF to base64: {e}")
+                encoded[image_path] = None
+                continue
+            encoded[image_path] = self._get_cached_image(cache_key)
+            if encoded[image_path] is None:
+                misses[image_path] = cache_key
+        
+        if len(misses) == 1:
+            # Not worth a round trip to the pool
+            image_path, cache_key = next(iter(misses.items()))
+            encoded[image_path] = self._encode_image(image_path)
+            if encoded[image_path]:
+                self._store_cached_image(cache_key, encoded[image_path])
+        elif misses:
+            pool = self._get_image_pool()
+            futures = {
+                image_path: pool.submit(_encode_image_file, image_path, self.image_max_size,
+                                        self.preprocess_images, self.greyscale_images)
+                for image_path in misses
+            }
+            for image_path, future in futures.items():
+                try:
+                    encoded[image_path] = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error converting image/PDF to base64: {e}")
+                    encoded[image_path] = None
+                if encoded[image_path]:
+                    self._store_cached_image(misses[image_path], encoded[image_path])
+        
+        return encoded
+    
+    def _get_image_pool(self):
+        """Process pool for _preprocess_many, created on first use and kept for later batches"""
+        with self._image_pool_lock:
+            if self._image_pool is None:
+                # spawn rather than fork: forking a process that already runs HTTP and
+                # request-handling threads can deadlock the children on inherited locks
+                self._image_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+                )
+                atexit.register(self.close)
+            return self._image_pool
+    
+    def close(self):
+        """Shut down the encoding worker processes, if started; also registered with atexit"""
+        with self._image_pool_lock:
+            pool, self._image_pool = self._image_pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _get_cached_image(self, cache_key):
+        """Return an encoded page from memory or disk, or None"""
+        with self._image_cache_lock:
+            img_base64 = self._image_cache.get(cache_key)
+            if img_base64 is not None:
+                self._image_cache.move_to_end(cache_key)
+                return img_base64
+        
+        if IMAGE_CACHE_DIR is None:
+            return None
+        try:
+            # Read raw bytes and decode as ASCII - skips text-mode newline translation and the
+            # locale codec for what is always a single line of base64
+            with open(os.path.join(IMAGE_CACHE_DIR, f"{cache_key}.b64"), 'rb') as f:
+                img_base64 = f.read().decode('ascii')
+        except (OSError, UnicodeDecodeError):
+            return None
+        
+        self._remember_image(cache_key, img_base64)
+        return img_base64
+    
+    def _store_cached_image(self, cache_key, img_base64):
+        """Store an encoded page in memory and on disk"""
+        self._remember_image(cache_key, img_base64)
+        if IMAGE_CACHE_DIR is not None:
+            self._write_cache_file(os.path.join(IMAGE_CACHE_DIR, f"{cache_key}.b64"), img_base64)
+    
+    def _remember_image(self, cache_key, img_base64):
+        """Add an encoded page to the in-memory LRU, evicting the least recently used entry when full"""
+        with self._image_cache_lock:
+            self._image_cache[cache_key] = img_base64
+            if len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
+    
+    def _image_cache_key(self, image_path, max_size=None):
+        """Cache key from path, mtime and size - changes whenever the file is replaced or edited"""
+        stat = os.stat(image_path)
+        identity = (f"{IMAGE_ENCODING_VERSION}|{max_size or self.image_max_size}|{self.preprocess_images}|"
+                    f"{self.greyscale_images}|"
+                    f"{os.path.abspath(image_path)}|"
+                    f"{stat.st_mtime_ns}|{stat.st_size}")
+        return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+    
+    def _write_cache_file(self, cache_file, data):
+        """Persist a cache entry; the disk caches are best-effort, so failures are only logged"""
+        try:
+            write_cache_file(cache_file, data)
+        except OSError as e:
+            self.logger.debug(f"Could not write cache file {cache_file}: {e}")
+    
+    def _encode_image(self, image_path, max_size=None):
+        """Render/load, downscale and encode an image or PDF page to base64 (uncached)"""
+        try:
+            return _encode_image_file(image_path, max_size or self.image_max_size,
+                                      self.preprocess_images, self.greyscale_images)
         except Exception as e:
             self.logger.error(f"Error converting image/PDF to base64: {e}")
             return None
     
-    def extract_comprehensive_document_info(self, image_path):
+    def _image_block(self, img_base64):
+        """Build the Claude image content block, detecting WebP vs JPEG from the payload"""
+        # base64 of a RIFF/WebP header always starts with 'UklGR'
+        media_type = "image/webp" if img_base64.startswith("UklGR") else "image/jpeg"
+        
+        if self.use_files_api:
+            file_id = self._uploaded_file_id(img_base64, media_type)
+            if file_id:
+                return {"type": "image", "source": {"type": "file", "file_id": file_id}}
+        
+        return {
+            "type": "image",
+            "source": {
+                "type": "base64",
+                "media_type": media_type,
+                "data": img_base64
+            }
+        }
+    
+    def _uploaded_file_id(self, img_base64, media_type):
+        """Upload a page through the Files API once and return its file_id (None if the upload fails)"""
+        content_key = hashlib.blake2b(img_base64.encode(), digest_size=16).hexdigest()
+        with self._file_ids_lock:
+            file_id = self._file_ids.get(content_key)
+            if file_id is not None:
+                self._file_ids.move_to_end(content_key)
+                return file_id
+        
+        try:
+            extension = media_type.split('/')[1]
+            uploaded = self.client.beta.files.upload(
+                file=(f"{content_key}.{extension}", base64.b64decode(img_base64), media_type)
+            )
+        except Exception as e:
+            self.logger.warning(f"Files API upload failed, sending the page inline: {e}")
+            return None
+        
+        with self._file_ids_lock:
+            self._file_ids[content_key] = uploaded.id
+            if len(self._file_ids) > IMAGE_CACHE_SIZE:
+                self._file_ids.popitem(last=False)
+        return uploaded.id
+    
+    def delete_uploaded_files(self):
+        """Delete every page this instance uploaded through the Files API (call when a job is done)"""
+        with self._file_ids_lock:
+            file_ids = list(self._file_ids.values())
+            self._file_ids.clear()
+        
+        for file_id in file_ids:
+            try:
+                self.client.beta.files.delete(file_id)
+            except Exception as e:
+                self.logger.debug(f"Could not delete uploaded file {file_id}: {e}")
+    
+    def _request_headers(self):
+        """Beta headers for messages requests, depending on how pages are attached (None if none)"""
+        return FILES_API_HEADERS if self.use_files_api else None
+    
+    def extract_comprehensive_document_info(self, image_path=None, img_base64=None, bypass_cache=False):
         """
-        Multi-pass extraction that identifies document type first, then extracts specific information
+        Identifies the document type and extracts its form-specific information in one API call,
+        adding a form-specific extraction call only when that answer is incomplete
+        Pass img_base64 (from image_to_base64) to reuse an already-encoded page instead of re-encoding it
+        Pass bypass_cache=True to ignore any cached response and re-query Claude (the new answer is cached)
         Returns: dict with all extracted information
         """
         try:
-            img_base64 = self.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.image_to_base64(image_path)
             if not img_base64:
                 return self._empty_result()
             
-            # First pass: Document identification and basic info
-            doc_type, basic_info = self._identify_document_type(img_base64)
+            # Single pass: document identification plus the form-specific fields for that type
+            result = self._finalize_extraction(self._identify_and_extract(img_base64, bypass_cache))
             
-            # Second pass: Form-specific detailed extraction
-            if doc_type in ['K-1', 'Schedule K-1']:
-                detailed_info = self._extract_k1_info(img_base64)
-            elif 'Form 1099' in doc_type or '1099' in doc_type:
-                detailed_info = self._extract_1099_info(img_base64)
-            elif 'Form W-2' in doc_type or 'W-2' in doc_type:
-                detailed_info = self._extract_w2_info(img_base64)
-            elif 'Form 1098' in doc_type or '1098' in doc_type:
-                detailed_info = self._extract_1098_info(img_base64)
-            elif 'Form 1040' in doc_type or '1040' in doc_type:
-                detailed_info = self._extract_1040_info(img_base64)
-            else:
-                # Generic extraction for other documents
-                detailed_info = self._extract_generic_info(img_base64)
-            
-            # Merge results
-            result = {**basic_info, **detailed_info}
-            result['document_type'] = doc_type
-            result['confidence'] = self._calculate_confidence(result)
+            # Early exit for confident answers; only incomplete ones pay for a form-specific call
+            if self._needs_form_extraction(result):
+                if image_path and self._is_high_detail_type(result['document_type']):
+                    # Dense form read poorly at the default size - retry on a sharper page
+                    img_base64 = self.image_to_base64(image_path, self.high_detail_max_size) or img_base64
+                result = self._extract_form_fields(img_base64, result, bypass_cache)
             
             return result
             
@@ -102,320 +810,476 @@ class EnhancedClaudeOCR:
             self.logger.error(f"Error in comprehensive extraction: {e}")
             return self._empty_result()
     
-    def _identify_document_type(self, img_base64):
-        """First pass: Identify document type and extract basic information"""
-        prompt = """
-        Analyze this tax document and identify:
+    def _finalize_extraction(self, result):
+        """Fill in document_type and confidence on a parsed identify-and-extract response"""
+        result['document_type'] = result.get('document_type') or 'Unknown Document'
+        if _form_type(result['document_type']) is GENERIC_FORM_TYPE:
+            self._fill_generic_fields(result)
+        result['confidence'] = self._calculate_confidence(result)
+        return result
+    
+    def _fill_generic_fields(self, result):
+        """
+        Derive the generic schema's name fields from primary_entity_name, which identification
+        already returned, so unrecognised documents do not need a generic extraction call
+        """
+        entity_name = result.get('primary_entity_name')
+        if not entity_name or not isinstance(entity_name, str):
+            return
+        
+        entity_type, _ = self.detect_business_entity_type(entity_name)
+        if entity_type != 'Individual':
+            if not result.get('business_name'):
+                result['business_name'] = entity_name
+            return
+        
+        # Only a plain "First Last" splits unambiguously; "Last, First", middle names, initials
+        # and suffixes (Jr., III) are left to the generic extraction, which reads them in context
+        parts = entity_name.split()
+        if (len(parts) != 2 or ',' in entity_name or any(part.endswith('.') for part in parts)
+                or parts[1].upper() in NAME_SUFFIXES):
+            return
+        if not result.get('person_first_name'):
+            result['person_first_name'] = parts[0]
+        if not result.get('person_last_name'):
+            result['person_last_name'] = parts[1]
+    
+    def _is_high_detail_type(self, document_type):
+        """Whether this document type canonicalizes to one of high_detail_types"""
+        return _canonicalize_doc_type(document_type) in self.high_detail_types
+    
+    def _needs_form_extraction(self, result):
+        """Whether a combined answer is weak enough to justify the form-specific extraction call"""
+        if (_form_type(result.get('document_type')) is GENERIC_FORM_TYPE
+                and result.get('person_first_name') and result.get('person_last_name')):
+            # _fill_generic_fields already split the name; the generic call would only re-read it
+            return False
         
-        1. DOCUMENT TYPE: What specific tax form is this? Look for form numbers and titles.
-        2. TAX YEAR: What tax year does this document relate to?
-        3. AMENDMENT STATUS: Is this an amended, corrected, or superseded document?
-        4. PRIMARY ENTITY: Who is the main subject/recipient of this document?
+        if result.get('confidence', 0.0) < self.early_exit_threshold:
+            return True
         
-        Common document types to look for:
-        - Form 1040 (Individual Income Tax Return)
-        - Form W-2 (Wage and Tax Statement)
-        - Form 1099 (various types: NEC, MISC, INT, DIV, R, etc.)
-        - Schedule K-1 (Partner's Share of Income)
-        - Form 1098 (Mortgage Interest Statement, Tuition Statement)
-        - Form W-9 (Request for Taxpayer Identification)
-        - State tax forms
-        - Property tax statements
-        - Bank/investment statements
-        
-        Return ONLY in this JSON format:
-        {
-            "document_type": "exact form name/type",
-            "tax_year": "YYYY or null",
-            "is_amended": true/false,
-            "amendment_type": "AMENDED/CORRECTED/SUPERSEDED or null",
-            "primary_entity_name": "name of primary person/entity or null"
-        }
-        """
+        critical_fields = ['primary_entity_name', 'tax_year']
+        missing_critical = sum(1 for field in critical_fields if not result.get(field))
+        if result.get('document_type') == 'Unknown Document':
+            missing_critical += 1
+        
+        return missing_critical >= 2
+    
+    def _extract_form_fields(self, img_base64, result, bypass_cache=False):
+        """Run the form-specific extraction for the detected document type and merge it into result"""
+        _, prompt, tool, max_tokens = _form_type(result['document_type'])
         
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=300,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": img_base64
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }]
-            )
-            
-            content = response.content[0].text
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group())
-                return result.get('document_type', 'Unknown Document'), result
-            else:
-                return 'Unknown Document', {}
-                
+            detailed_info = self._request_json(img_base64, prompt, max_tokens=max_tokens, bypass_cache=bypass_cache,
+                                               tool=tool)
         except Exception as e:
-            self.logger.error(f"Error in document identification: {e}")
-            return 'Unknown Document', {}
+            self.logger.error(f"Error in form-specific extraction: {e}")
+            return result
+        
+        return self._merge_form_extraction(result, detailed_info) if detailed_info else result
+    
+    def _identify_and_extract(self, img_base64, bypass_cache=False):
+        """
+        Identify the document type and extract its form-specific fields in one API call,
+        instead of an identification round trip followed by a per-form extraction
+        """
+        try:
+            return self._request_json(img_base64, IDENTIFY_AND_EXTRACT_PROMPT, max_tokens=IDENTIFY_AND_EXTRACT_MAX_TOKENS,
+                                      bypass_cache=bypass_cache)
+        except Exception as e:
+            self.logger.error(f"Error in combined identification/extraction: {e}")
+            return {}
+    
+    def _extract_form_type(self, img_base64, form_type):
+        """Run one FORM_TYPES entry's extraction prompt with its own max_tokens"""
+        _, prompt, tool, max_tokens = form_type
+        return self._make_api_call(img_base64, prompt, tool=tool, max_tokens=max_tokens)
     
     def _extract_k1_info(self, img_base64):
         """Extract K-1 specific information"""
-        prompt = """
-        This is a Schedule K-1 document. Extract the following information precisely:
-        
-        PARTNERSHIP/ENTITY INFORMATION (the issuer):
-        - Partnership/Entity name
-        - Partnership EIN
-        - Partnership address
-        - Form source (1065/1120S/1041)
-        - Entity type (Partnership, S Corporation, Trust, Estate)
-        
-        PARTNER/SHAREHOLDER INFORMATION (the recipient):
-        - Partner/shareholder name (FIRST and LAST name separately)
-        - Partner's percentage or share (if visible)
-        - Partner type (General Partner, Limited Partner, Shareholder, Beneficiary)
-        - Partner's SSN or EIN (if visible)
-        
-        DOCUMENT DETAILS:
-        - Tax year
-        - Final K-1 indicator (check for "Final K-1" checkbox)
-        - Amendment status
-        
-        Return ONLY in this JSON format:
-        {
-            "partnership_name": "name or null",
-            "partnership_ein": "EIN or null",
-            "partnership_address": "address or null",
-            "form_source": "1065/1120S/1041 or null",
-            "entity_type": "Partnership/S Corporation/Trust/Estate or null",
-            "partner_first_name": "first name or null",
-            "partner_last_name": "last name or null",
-            "partner_percentage": "percentage or null",
-            "partner_type": "type or null",
-            "is_final_k1": true/false,
-            "tax_year": "YYYY or null"
-        }
-        """
-        
-        return self._make_api_call(img_base64, prompt)
+        return self._extract_form_type(img_base64, FORM_TYPES['K1'])
     
     def _extract_1099_info(self, img_base64):
         """Extract 1099 specific information"""
-        prompt = """
-        This is a Form 1099. Extract the following information precisely:
-        
-        PAYER INFORMATION (who paid):
-        - Payer name (business/organization name)
-        - Payer address
-        - Payer's Federal ID number
-        
-        RECIPIENT INFORMATION (who received payment):
-        - Recipient name (FIRST and LAST name separately if individual, or business name)
-        - Recipient address
-        - Recipient's TIN/SSN
-        
-        FORM DETAILS:
-        - Specific 1099 type (1099-NEC, 1099-MISC, 1099-INT, 1099-DIV, etc.)
-        - Tax year
-        - Box amounts (key amounts paid)
-        - Correction indicator
-        
-        BUSINESS CONTEXT:
-        - Type of service/payment (for NEC/MISC)
-        - Account designation (for investment forms)
-        
-        Return ONLY in this JSON format:
-        {
-            "form_type": "1099-XXX",
-            "payer_name": "name or null",
-            "payer_address": "address or null",
-            "recipient_first_name": "first name or null",
-            "recipient_last_name": "last name or null",
-            "recipient_business_name": "business name if not individual or null",
-            "payment_type": "service type or null",
-            "tax_year": "YYYY or null",
-            "is_corrected": true/false
-        }
-        """
-        
-        return self._make_api_call(img_base64, prompt)
+        return self._extract_form_type(img_base64, FORM_TYPES['1099'])
     
     def _extract_w2_info(self, img_base64):
         """Extract W-2 specific information"""
-        prompt = """
-        This is a Form W-2. Extract the following information precisely:
-        
-        EMPLOYER INFORMATION:
-        - Employer name
-        - Employer address
-        - Employer EIN
-        
-        EMPLOYEE INFORMATION:
-        - Employee name (FIRST and LAST name separately)
-        - Employee address
-        - Employee SSN
-        
-        DOCUMENT DETAILS:
-        - Tax year
-        - Control number
-        - Copy designation (Copy A, B, C, etc.)
-        - State information (if state W-2)
-        
-        Return ONLY in this JSON format:
-        {
-            "employer_name": "name or null",
-            "employer_address": "address or null",
-            "employee_first_name": "first name or null",
-            "employee_last_name": "last name or null",
-            "employee_address": "address or null",
-            "tax_year": "YYYY or null",
-            "control_number": "number or null",
-            "copy_designation": "copy type or null"
-        }
-        """
-        
-        return self._make_api_call(img_base64, prompt)
+        return self._extract_form_type(img_base64, FORM_TYPES['W2'])
     
     def _extract_1098_info(self, img_base64):
         """Extract 1098 specific information"""
-        prompt = """
-        This is a Form 1098. Extract the following information precisely:
-        
-        LENDER/INSTITUTION INFORMATION:
-        - Lender/institution name
-        - Lender address
-        - Lender TIN
-        
-        BORROWER/STUDENT INFORMATION:
-        - Borrower/student name (FIRST and LAST name separately)
-        - Borrower address
-        - Borrower SSN
-        
-        FORM DETAILS:
-        - Specific 1098 type (1098, 1098-E, 1098-T, etc.)
-        - Tax year
-        - Property address (for mortgage forms)
-        - Account number
-        
-        Return ONLY in this JSON format:
-        {
-            "form_type": "1098-XXX or 1098",
-            "lender_name": "name or null",
-            "lender_address": "address or null",
-            "borrower_first_name": "first name or null",
-            "borrower_last_name": "last name or null",
-            "property_address": "address or null",
-            "account_number": "number or null",
-            "tax_year": "YYYY or null"
-        }
-        """
-        
-        return self._make_api_call(img_base64, prompt)
+        return self._extract_form_type(img_base64, FORM_TYPES['1098'])
     
     def _extract_1040_info(self, img_base64):
         """Extract 1040 specific information"""
-        prompt = """
-        This is a Form 1040. Extract the following information precisely:
-        
-        TAXPAYER INFORMATION:
-        - Primary taxpayer name (FIRST and LAST name separately)
-        - Spouse name if joint return (FIRST and LAST name separately)
-        - Filing status (Single, Married Filing Jointly, etc.)
-        - Address
-        
-        DOCUMENT DETAILS:
-        - Tax year
-        - Form type (1040, 1040EZ, 1040A, 1040NR, etc.)
-        - Amendment status
-        - State (if state return)
-        
-        Return ONLY in this JSON format:
-        {
-            "primary_first_name": "first name or null",
-            "primary_last_name": "last name or null",
-            "spouse_first_name": "first name or null",
-            "spouse_last_name": "last name or null",
-            "filing_status": "status or null",
-            "form_type": "1040 variant",
-            "tax_year": "YYYY or null",
-            "is_joint_return": true/false,
-            "state": "state code or null"
-        }
-        """
-        
-        return self._make_api_call(img_base64, prompt)
+        return self._extract_form_type(img_base64, FORM_TYPES['1040'])
     
     def _extract_generic_info(self, img_base64):
         """Extract generic information for unknown document types"""
-        prompt = """
-        Extract any identifiable information from this document:
+        return self._extract_form_type(img_base64, GENERIC_FORM_TYPE)
+    
+    def _message_params(self, img_base64, prompt, max_tokens, tool=None):
+        """
+        Build messages.create parameters for one image + prompt request.
+        tool (see _schema_tool) forces a structured tool call instead of a text answer.
+        """
+        params = {
+            "model": self.extract_model,
+            "max_tokens": max_tokens,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    # Image first, then the instructions, as Anthropic recommends for vision prompts
+                    self._image_block(img_base64),
+                    {"type": "text", "text": prompt}
+                ]
+            }]
+        }
+        if tool:
+            params["tools"] = [tool]
+            params["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return params
+    
+    def _response_cache_key(self, img_base64, prompt, max_tokens, tool=None):
+        """Hex key for the response cache from version, model, image content, prompt text, tool and max_tokens"""
+        key = hashlib.blake2b(digest_size=16)
+        key.update(f"{RESPONSE_CACHE_VERSION}|{self.extract_model}|{max_tokens}|"
+                   f"{tool['name'] if tool else ''}|".encode())
+        key.update(hashlib.blake2b(prompt.encode(), digest_size=16).digest())
+        key.update(img_base64.encode())
+        return key.hexdigest()
+    
+    def _get_cached_response(self, cache_key):
+        """Return a copy of a cached parsed response from memory or disk, or None"""
+        with self._response_cache_lock:
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                self._response_cache.move_to_end(cache_key)
+                return copy.deepcopy(cached)
+        
+        if RESPONSE_CACHE_DIR is None:
+            return None
+        try:
+            with open(os.path.join(RESPONSE_CACHE_DIR, f"{cache_key}.json"), 'rb') as f:
+                cached = _json_loads(f.read())
+        except (OSError, ValueError):
+            return None
         
-        PERSON/ENTITY INFORMATION:
-        - Any person's name (FIRST and LAST name separately)
-        - Any business/organization name
-        - Address information
+        self._remember_response(cache_key, cached)
+        return cached
+    
+    def _store_cached_response(self, cache_key, result):
+        """Store a parsed response in memory and on disk"""
+        self._remember_response(cache_key, result)
+        if RESPONSE_CACHE_DIR is not None:
+            self._write_cache_file(os.path.join(RESPONSE_CACHE_DIR, f"{cache_key}.json"), json.dumps(result))
+    
+    def _remember_response(self, cache_key, result):
+        """Add a response to the in-memory LRU, evicting the least recently used entry when full"""
+        with self._response_cache_lock:
+            self._response_cache[cache_key] = copy.deepcopy(result)
+            if len(self._response_cache) > RESPONSE_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+    
+    def _request_json(self, img_base64, prompt, max_tokens, bypass_cache=False, tool=None):
+        """
+        Send one image + prompt to Claude and return the parsed JSON dict ({} if none).
+        Responses are cached by image content hash and prompt, so re-scans and retries are free;
+        bypass_cache=True skips the lookup but still caches the fresh response.
+        An answer cut off at max_tokens is retried once with twice the budget.
+        """
+        cache_key = self._response_cache_key(img_base64, prompt, max_tokens, tool)
+        if not bypass_cache:
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                return cached
+        
+        params = self._message_params(img_base64, prompt, max_tokens, tool=tool)
+        response = self.client.messages.create(**params, extra_headers=self._request_headers())
+        if response.stop_reason == 'max_tokens':
+            params['max_tokens'] = self._truncation_retry_budget(max_tokens)
+            response = self.client.messages.create(**params, extra_headers=self._request_headers())
+        
+        result = _message_json(response)
+        if result:
+            self._store_cached_response(cache_key, result)
+        
+        return result
+    
+    def _truncation_retry_budget(self, max_tokens):
+        """max_tokens for the retry of an answer that was cut off (a partial tool call or JSON object)"""
+        self.logger.warning(f"Response truncated at max_tokens={max_tokens}, retrying with {2 * max_tokens}")
+        return 2 * max_tokens
+    
+    def _async_client(self):
+        """
+        AsyncAnthropic client with the same pool settings as the shared sync client.
+        Created per event loop, since httpx async connections cannot outlive their loop.
+        """
+        return anthropic.AsyncAnthropic(
+            api_key=self.client.api_key,
+            http_client=httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        )
+    
+    async def _arequest_json(self, aclient, img_base64, prompt, max_tokens, tool=None):
+        """Async counterpart of _request_json, sharing its response cache"""
+        cache_key = self._response_cache_key(img_base64, prompt, max_tokens, tool)
+        cached = self._get_cached_response(cache_key)
+        if cached is not None:
+            return cached
+        
+        params = self._message_params(img_base64, prompt, max_tokens, tool=tool)
+        response = await aclient.messages.create(**params, extra_headers=self._request_headers())
+        if response.stop_reason == 'max_tokens':
+            params['max_tokens'] = self._truncation_retry_budget(max_tokens)
+            response = await aclient.messages.create(**params, extra_headers=self._request_headers())
+        
+        result = _message_json(response)
+        if result:
+            self._store_cached_response(cache_key, result)
+        
+        return result
+    
+    async def _aextract_comprehensive_document_info(self, aclient, image_path=None, img_base64=None):
+        """Async counterpart of extract_comprehensive_document_info"""
+        try:
+            if img_base64 is None:
+                # PIL/Poppler work would block the event loop
+                img_base64 = await asyncio.to_thread(self.image_to_base64, image_path)
+            if not img_base64:
+                return self._empty_result()
+            
+            try:
+                result = await self._arequest_json(
+                    aclient, img_base64, IDENTIFY_AND_EXTRACT_PROMPT, IDENTIFY_AND_EXTRACT_MAX_TOKENS
+                )
+            except Exception as e:
+                self.logger.error(f"Error in combined identification/extraction: {e}")
+                result = {}
+            
+            result = self._finalize_extraction(result)
+            if self._needs_form_extraction(result):
+                _, prompt, tool, max_tokens = _form_type(result['document_type'])
+                try:
+                    detailed_info = await self._arequest_json(aclient, img_base64, prompt, max_tokens, tool=tool)
+                except Exception as e:
+                    self.logger.error(f"Error in form-specific extraction: {e}")
+                    detailed_info = {}
+                if detailed_info:
+                    result = self._merge_form_extraction(result, detailed_info)
+            
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Error in comprehensive extraction: {e}")
+            return self._empty_result()
+    
+    async def _aextract_with_validation(self, aclient, image_path=None, img_base64=None):
+        """Async counterpart of extract_with_validation"""
+        try:
+            if img_base64 is None:
+                img_base64 = await asyncio.to_thread(self.image_to_base64, image_path)
+            if not img_base64:
+                return self._empty_result()
+            
+            initial_result = await self._aextract_comprehensive_document_info(aclient, img_base64=img_base64)
+            
+            # The validation prompt quotes the initial answer, so the two calls cannot overlap
+            if initial_result.get('confidence', 0) > 0.3:
+                try:
+                    validation_result = await self._arequest_json(
+                        aclient, img_base64, self._validation_prompt(initial_result), max_tokens=400
+                    )
+                except Exception as e:
+                    self.logger.error(f"Error in validation API call: {e}")
+                    validation_result = {}
+                return self._merge_with_validation(initial_result, validation_result)
+            
+            initial_result['validation_applied'] = False
+            return initial_result
+            
+        except Exception as e:
+            self.logger.error(f"Error in validation extraction: {e}")
+            return self._empty_result()
+    
+    async def extract_batch_async(self, image_paths, max_concurrency=20, validate=False):
+        """
+        Extract many documents concurrently with AsyncAnthropic, keeping at most
+        max_concurrency documents in flight to stay under API rate limits.
+        validate=True runs extract_with_validation per document; one document's validation
+        pass then overlaps with other documents' extractions instead of blocking them.
+        Returns: dict mapping each image path to its extraction result
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        extract = self._aextract_with_validation if validate else self._aextract_comprehensive_document_info
+        
+        # Encode everything up front on all cores, off the event loop
+        encoded = await asyncio.to_thread(self._preprocess_many, image_paths)
+        
+        async with self._async_client() as aclient:
+            async def bounded(image_path):
+                if not encoded[image_path]:
+                    return self._empty_result()
+                async with semaphore:
+                    return await extract(aclient, image_path, img_base64=encoded[image_path])
+            
+            results = await asyncio.gather(*(bounded(path) for path in image_paths))
         
-        DOCUMENT DETAILS:
-        - Document type/title
-        - Date or year information
-        - Account numbers or reference numbers
+        return dict(zip(image_paths, results))
+    
+    def extract_many(self, image_paths, max_workers=MAX_CONCURRENT_REQUESTS):
+        """
+        Extract many documents right away (unlike extract_batch): pages are encoded on all cores
+        by _preprocess_many, then extract_comprehensive_document_info runs on max_workers threads,
+        which wait on the network with the GIL released.
+        Returns: dict mapping each image path to its extraction result
+        """
+        if not image_paths:
+            return {}
+        return self._extract_encoded_many(self._preprocess_many(image_paths), max_workers)
+    
+    def _extract_encoded_many(self, encoded, max_workers=MAX_CONCURRENT_REQUESTS):
+        """Run extract_comprehensive_document_info concurrently over {image_path: img_base64}"""
+        def extract(image_path):
+            if not encoded[image_path]:
+                return self._empty_result()
+            with self._request_semaphore:
+                return self.extract_comprehensive_document_info(image_path, img_base64=encoded[image_path])
         
-        Return ONLY in this JSON format:
-        {
-            "person_first_name": "first name or null",
-            "person_last_name": "last name or null",
-            "business_name": "business name or null",
-            "document_title": "title or null",
-            "year": "YYYY or null",
-            "reference_number": "number or null"
-        }
+        if len(encoded) <= 1:
+            return {image_path: extract(image_path) for image_path in encoded}
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(encoded))) as executor:
+            return dict(zip(encoded, executor.map(extract, encoded)))
+    
+    def extract_batch(self, image_paths, poll_interval=10, timeout=3600):
         """
+        Run extract_comprehensive_document_info over many files through the Message Batches API,
+        which is billed at 50% and parallelized server-side. Documents whose combined answer is
+        incomplete (see _needs_form_extraction) get their form-specific extraction in a second batch.
+        Falls back to synchronous calls if a batch cannot be submitted or does not finish
+        within timeout seconds.
+        Returns: dict mapping each image path to its extraction result
+        """
+        if not image_paths:
+            return {}
+        
+        encoded = self._preprocess_many(image_paths)
         
-        return self._make_api_call(img_base64, prompt)
+        # Stage 1: combined identification + extraction for every document
+        results = {}
+        pending = {}  # custom_id -> (image_path, img_base64, cache_key)
+        for index, (image_path, img_base64) in enumerate(encoded.items()):
+            if not img_base64:
+                results[image_path] = self._empty_result()
+                continue
+            
+            cache_key = self._response_cache_key(
+                img_base64, IDENTIFY_AND_EXTRACT_PROMPT, IDENTIFY_AND_EXTRACT_MAX_TOKENS
+            )
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                results[image_path] = self._finalize_extraction(cached)
+            else:
+                # custom_id must match ^[a-zA-Z0-9_-]{1,64}$, so paths cannot be used directly
+                pending[f"doc-{index}"] = (image_path, img_base64, cache_key)
+        
+        answers = self._run_message_batch(
+            {custom_id: self._message_params(img_base64, IDENTIFY_AND_EXTRACT_PROMPT, IDENTIFY_AND_EXTRACT_MAX_TOKENS)
+             for custom_id, (_, img_base64, _) in pending.items()},
+            poll_interval, timeout
+        )
+        for custom_id, parsed in answers.items():
+            image_path, _, cache_key = pending.pop(custom_id)
+            if parsed:
+                self._store_cached_response(cache_key, parsed)
+            results[image_path] = self._finalize_extraction(parsed)
+        
+        # Anything the batch did not return (errors, expiry, fallback) goes through the normal path
+        results.update(self._extract_encoded_many(
+            {image_path: img_base64 for image_path, img_base64, _ in pending.values()}
+        ))
+        
+        # Stage 2: form-specific extraction for incomplete answers, keyed by detected document type
+        followups = {}  # custom_id -> (image_path, cache_key, params)
+        for index, image_path in enumerate(encoded):
+            result = results[image_path]
+            if not encoded[image_path] or not self._needs_form_extraction(result):
+                continue
+            _, prompt, tool, max_tokens = _form_type(result['document_type'])
+            cache_key = self._response_cache_key(encoded[image_path], prompt, max_tokens, tool)
+            cached = self._get_cached_response(cache_key)
+            if cached is not None:
+                results[image_path] = self._merge_form_extraction(result, cached)
+            else:
+                followups[f"doc-{index}"] = (
+                    image_path, cache_key, self._message_params(encoded[image_path], prompt, max_tokens, tool=tool)
+                )
+        
+        answers = self._run_message_batch(
+            {custom_id: params for custom_id, (_, _, params) in followups.items()}, poll_interval, timeout
+        )
+        for custom_id, parsed in answers.items():
+            image_path, cache_key, _ = followups[custom_id]
+            if parsed:
+                self._store_cached_response(cache_key, parsed)
+                results[image_path] = self._merge_form_extraction(results[image_path], parsed)
+        
+        return {image_path: results[image_path] for image_path in image_paths}
     
-    def _make_api_call(self, img_base64, prompt):
-        """Make API call to Claude and parse JSON response"""
+    def _run_message_batch(self, requests, poll_interval, timeout):
+        """
+        Submit {custom_id: params} as one message batch and wait for it to finish.
+        Returns: dict of custom_id -> parsed JSON for the requests that succeeded ({} on failure)
+        """
+        if not requests:
+            return {}
+        
+        answers = {}
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=500,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": img_base64
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }]
-            )
+            batch = self.client.messages.batches.create(requests=[
+                {"custom_id": custom_id, "params": params} for custom_id, params in requests.items()
+            ], extra_headers=self._request_headers())
+            self.logger.info(f"Submitted message batch {batch.id} with {len(requests)} requests")
             
-            content = response.content[0].text
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {}
+            deadline = time.time() + timeout
+            while batch.processing_status != 'ended':
+                if time.time() > deadline:
+                    self.client.messages.batches.cancel(batch.id)
+                    raise TimeoutError(f"Message batch {batch.id} did not finish within {timeout}s")
+                time.sleep(poll_interval)
+                batch = self.client.messages.batches.retrieve(batch.id)
+            
+            for entry in self.client.messages.batches.results(batch.id):
+                if entry.custom_id in requests and entry.result.type == 'succeeded':
+                    if entry.result.message.stop_reason == 'max_tokens':
+                        # Cut off mid-answer - left out like a failed request, never merged or cached
+                        self.logger.warning(f"Batch answer {entry.custom_id} truncated at max_tokens")
+                        continue
+                    try:
+                        answers[entry.custom_id] = _message_json(entry.result.message)
+                    except ValueError as e:
+                        # One malformed answer must not lose the rest of the batch; this document
+                        # is simply left out, like a failed request
+                        self.logger.warning(f"Could not parse batch answer {entry.custom_id}: {e}")
+                    
+        except Exception as e:
+            self.logger.warning(f"Message batch unavailable, falling back to synchronous extraction: {e}")
+        
+        return answers
+    
+    def _merge_form_extraction(self, result, detailed_info):
+        """Overlay the non-null form-specific fields on a combined answer and rescore it"""
+        merged = {**result, **{k: v for k, v in detailed_info.items() if v is not None}}
+        merged['document_type'] = result['document_type']
+        merged['confidence'] = self._calculate_confidence(merged)
+        return merged
+    
+    def _make_api_call(self, img_base64, prompt, tool=None, max_tokens=500):
+        """Make API call to Claude and parse JSON response (pass tool to force structured output)"""
+        try:
+            return self._request_json(img_base64, prompt, max_tokens=max_tokens, tool=tool)
                 
         except Exception as e:
             self.logger.error(f"Error in API call: {e}")
@@ -423,19 +1287,13 @@ class EnhancedClaudeOCR:
     
     def _calculate_confidence(self, result):
         """Calculate confidence score based on extracted information completeness"""
+        # Weighted share of the fields this document type is expected to have (excluding null values)
         score = 0.0
-        total_fields = 0
-        filled_fields = 0
-        
-        # Count filled vs total fields (excluding null values)
-        for key, value in result.items():
-            if key not in ['confidence', 'document_type']:
-                total_fields += 1
-                if value and value != 'null' and str(value).strip():
-                    filled_fields += 1
-        
-        if total_fields > 0:
-            score = filled_fields / total_fields
+        for field, weight in _confidence_weights(str(result.get('document_type'))):
+            value = result.get(field)
+            # Values are almost always strings already - skip the str() copy for those
+            if value and value != 'null' and (value if isinstance(value, str) else str(value)).strip():
+                score += weight
         
         # Bonus for having key information
         if result.get('tax_year'):
@@ -455,6 +1313,34 @@ class EnhancedClaudeOCR:
             'amendment_type': None
         }
     
+    def _build_entity_matchers(self):
+        """
+        Compile every entity indicator into one matcher so detection is a single pass over
+        the text: an Aho-Corasick automaton when pyahocorasick is installed, otherwise one
+        regex alternation. Both map a matched word to its lowest priority (entity_indicators order).
+        """
+        self._entity_types = list(self.entity_indicators)
+        self._indicator_priority = {}
+        for priority, indicators in enumerate(self.entity_indicators.values()):
+            for indicator in indicators:
+                self._indicator_priority.setdefault(indicator, priority)
+        
+        self._entity_automaton = None
+        self._entity_pattern = None
+        if ahocorasick is not None:
+            self._entity_automaton = ahocorasick.Automaton()
+            for indicator, priority in self._indicator_priority.items():
+                self._entity_automaton.add_word(indicator, (priority, len(indicator)))
+            self._entity_automaton.make_automaton()
+        else:
+            # Lookahead so overlapping words (CORP inside S CORP) are all seen; alternatives in
+            # priority order so the best entity type wins where several words start together.
+            # Indicators must stand alone (TR must not match PATRICIA); lookarounds rather than
+            # \b because some indicators end in a period (CO., L.P.)
+            self._entity_pattern = re.compile(
+                r'(?<!\w)(?=(' + '|'.join(map(re.escape, self._indicator_priority)) + r')(?!\w))'
+            )
+    
     def detect_business_entity_type(self, text):
         """Detect business entity type from text"""
         if not text:
@@ -462,36 +1348,31 @@ class EnhancedClaudeOCR:
         
         text_upper = text.upper()
         
-        for entity_type, indicators in self.entity_indicators.items():
-            for indicator in indicators:
-                if indicator in text_upper:
-                    return entity_type, text
+        # Keep the entity_indicators priority order rather than position in the text
+        if self._entity_automaton is not None:
+            matched = [
+                priority for end, (priority, length) in self._entity_automaton.iter(text_upper)
+                if _is_whole_word(text_upper, end - length + 1, end + 1)
+            ]
+        else:
+            matched = [self._indicator_priority[m.group(1)] for m in self._entity_pattern.finditer(text_upper)]
         
+        if matched:
+            return self._entity_types[min(matched)], text
         return 'Individual', text
     
-    def extract_client_name_legacy(self, image_path):
+    def extract_client_name_legacy(self, image_path=None, img_base64=None):
         """
         Legacy method for backward compatibility
         Extract client name and tax year from document
         Returns: (first_name, last_name, tax_year)
         """
         try:
-            result = self.extract_comprehensive_document_info(image_path)
+            result = self.extract_comprehensive_document_info(image_path, img_base64=img_base64)
             
-            # Extract first and last name from various possible fields
-            first_name = (result.get('partner_first_name') or 
-                         result.get('recipient_first_name') or 
-                         result.get('employee_first_name') or 
-                         result.get('borrower_first_name') or 
-                         result.get('primary_first_name') or 
-                         result.get('person_first_name'))
-            
-            last_name = (result.get('partner_last_name') or 
-                        result.get('recipient_last_name') or 
-                        result.get('employee_last_name') or 
-                        result.get('borrower_last_name') or 
-                        result.get('primary_last_name') or 
-                        result.get('person_last_name'))
+            # Extract first and last name from the first populated field, in priority order
+            first_name = _first_truthy(result, self._FIRST_NAME_FIELDS)
+            last_name = _first_truthy(result, self._LAST_NAME_FIELDS)
             
             tax_year = result.get('tax_year')
             
@@ -501,22 +1382,27 @@ class EnhancedClaudeOCR:
             self.logger.error(f"Error in legacy extraction: {e}")
             return None, None, None 
 
-    def extract_with_validation(self, image_path):
+    def extract_with_validation(self, image_path=None, img_base64=None, bypass_cache=False):
         """
         Multi-step extraction with self-validation for higher accuracy
+        Pass img_base64 to reuse an already-encoded page; it is encoded once and shared by both passes
+        Pass bypass_cache=True to re-query Claude instead of reusing cached responses
         Returns: dict with validated and corrected information
         """
         try:
-            img_base64 = self.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.image_to_base64(image_path)
             if not img_base64:
                 return self._empty_result()
             
             # Step 1: Initial extraction (existing method)
-            initial_result = self.extract_comprehensive_document_info(image_path)
+            initial_result = self.extract_comprehensive_document_info(
+                image_path, img_base64=img_base64, bypass_cache=bypass_cache
+            )
             
             # Step 2: Validation pass - only if initial extraction had decent confidence
             if initial_result.get('confidence', 0) > 0.3:
-                validation_result = self._validate_extraction(img_base64, initial_result)
+                validation_result = self._validate_extraction(img_base64, initial_result, bypass_cache)
                 
                 # Step 3: Merge and improve results
                 final_result = self._merge_with_validation(initial_result, validation_result)
@@ -531,77 +1417,29 @@ class EnhancedClaudeOCR:
             self.logger.error(f"Error in validation extraction: {e}")
             return self._empty_result()
     
-    def _validate_extraction(self, img_base64, initial_result):
+    def _validate_extraction(self, img_base64, initial_result, bypass_cache=False):
         """
         Second pass to validate and correct initial extraction
         """
-        doc_type = initial_result.get('document_type', 'Unknown')
-        client_name = initial_result.get('client_name') or initial_result.get('person_name') or 'Unknown'
-        tax_year = initial_result.get('tax_year', 'Unknown')
-        
-        validation_prompt = f"""
-        VALIDATION TASK: Review this tax document and verify the extracted information.
-        
-        Previously extracted data:
-        - Document Type: {doc_type}
-        - Client/Person Name: {client_name}
-        - Tax Year: {tax_year}
-        
-        Instructions:
-        1. Look at the document image carefully
-        2. Verify if each extracted field is CORRECT
-        3. If you find errors, provide the CORRECT values
-        4. Rate your confidence (0.0 to 1.0) for each field
-        5. Focus on accuracy - double-check names, years, and form types
-        
-        Return ONLY this JSON format:
-        {{
-            "document_type_correct": true/false,
-            "corrected_document_type": "correct form name if wrong, or null",
-            "client_name_correct": true/false, 
-            "corrected_client_name": "correct name if wrong, or null",
-            "tax_year_correct": true/false,
-            "corrected_tax_year": "YYYY if wrong, or null",
-            "validation_confidence": 0.0-1.0,
-            "validation_notes": "brief explanation of any corrections"
-        }}
-        """
+        validation_prompt = self._validation_prompt(initial_result)
         
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=400,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": img_base64
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": validation_prompt
-                        }
-                    ]
-                }]
-            )
-            
-            content = response.content[0].text
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return {}
+            return self._request_json(img_base64, validation_prompt, max_tokens=400, bypass_cache=bypass_cache)
                 
         except Exception as e:
             self.logger.error(f"Error in validation API call: {e}")
             return {}
     
+    def _validation_prompt(self, initial_result):
+        """Fill the validation prompt with the values from the initial extraction"""
+        doc_type = initial_result.get('document_type', 'Unknown')
+        client_name = initial_result.get('client_name') or initial_result.get('person_name') or 'Unknown'
+        tax_year = initial_result.get('tax_year', 'Unknown')
+        
+        return VALIDATION_PROMPT_TEMPLATE.format(
+            doc_type=doc_type, client_name=client_name, tax_year=tax_year
+        )
+    
     def _merge_with_validation(self, initial_result, validation_result):
         """
         Intelligently merge initial extraction with validation results
@@ -689,18 +1527,20 @@ class EnhancedClaudeOCR:
         final_confidence = min(1.0, completeness_score + validation_bonus + doc_type_bonus + year_bonus)
         
         return final_confidence 
-    def extract_with_smart_validation(self, image_path):
+    def extract_with_smart_validation(self, image_path=None, img_base64=None):
         """
         Intelligent extraction with selective validation - reduces costs while maintaining accuracy
         Only applies validation when it's actually beneficial (saves ~50-60% of API calls)
+        Pass img_base64 to reuse an already-encoded page; it is encoded once and shared by both passes
         """
         try:
-            img_base64 = self.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.image_to_base64(image_path)
             if not img_base64:
                 return self._empty_result()
             
             # Step 1: Initial extraction (existing method)
-            initial_result = self.extract_comprehensive_document_info(image_path)
+            initial_result = self.extract_comprehensive_document_info(image_path, img_base64=img_base64)
             initial_confidence = initial_result.get('confidence', 0.0)
             
             # Step 2: Smart validation decision - only validate when beneficial
@@ -16,7 +16,248 @@ from typing import Dict, List, Tuple, Optional
 import os
 import json
 import pickle
+import copy
+import hashlib
+import heapq
+import threading
+import multiprocessing
+import atexit
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from contextlib import contextmanager
+from itertools import chain
+from operator import itemgetter
 from datetime import datetime
+from utils.disk_cache import cache_dir, write_cache_file
+
+try:
+    import onnxruntime as ort
+except ImportError:  # Optional - the PyTorch models are used directly without it
+    ort = None
+
+try:
+    import ahocorasick  # optional: single-pass trigger word prefilter for the name patterns
+except ImportError:
+    ahocorasick = None
+
+try:
+    from numba import njit  # optional: compiled bbox overlap kernel for location-based detection
+except ImportError:
+    njit = None
+
+try:
+    import orjson  # optional: several times faster (de)serialisation of the learning and cache files
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data) -> bytes:
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    _json_loads = json.loads
+
+# Detection results cache: in-memory LRU in front of an optional on-disk store that survives
+# restarts (see utils.disk_cache; None when Config.DISK_CACHE_DIR is unset).
+# Bump NAME_CACHE_VERSION whenever detection output changes for the same page.
+NAME_CACHE_DIR = cache_dir('name_detection')
+NAME_CACHE_VERSION = 3
+NAME_CACHE_SIZE = 512
+
+# Common non-name terms that rule out a candidate person name
+NAME_EXCLUDE_TERMS = frozenset({
+    'federal', 'state', 'total', 'units', 'value', 'amount', 'tax', 'trust', 'assets',
+    'liquid', 'estate', 'other', 'held', 'goodman', 'llc', 'applicable', 'discounts',
+    'net', 'taxable', 'related', 'generation', 'skipping', 'payable', 'available',
+    'estimated', 'capital', 'gains', 'monetization', 'beneficiaries', 'transfer',
+    'basis', 'personal', 'article', 'exempt', 'nia', 'uw', 'appt', 'farber'
+})
+# Any of the terms as a whole word, in any case (so 'nia' rules out "Nia Trust" but not "Sonia");
+# longest first so a term never loses to a shorter one it starts with
+NAME_EXCLUDE_RE = re.compile(
+    r'\b(?:' + '|'.join(map(re.escape, sorted(NAME_EXCLUDE_TERMS, key=len, reverse=True))) + r')\b',
+    re.IGNORECASE
+)
+# The same terms in an Aho-Corasick automaton when pyahocorasick is installed: one pass over the
+# name however many terms there are (see _contains_exclude_term)
+if ahocorasick is not None:
+    NAME_EXCLUDE_AUTOMATON = ahocorasick.Automaton()
+    for _term in NAME_EXCLUDE_TERMS:
+        NAME_EXCLUDE_AUTOMATON.add_word(_term, _term)
+    NAME_EXCLUDE_AUTOMATON.make_automaton()
+    del _term
+else:
+    NAME_EXCLUDE_AUTOMATON = None
+FINANCIAL_TERMS_RE = re.compile(r'total|value|amount|units|federal|state|tax')
+
+# Pages whose OCR output is kept in memory, so learning from a correction right after
+# detection does not run tesseract on the page again
+OCR_MEMO_SIZE = 16
+
+# With disk caching enabled (see utils.disk_cache) OCR output is also stored on disk by page
+# content, so re-scanning a page after a restart skips tesseract.
+# Bump OCR_CACHE_VERSION whenever _ocr_page or the OCR post-processing changes.
+OCR_CACHE_DIR = cache_dir('name_ocr')
+OCR_CACHE_VERSION = 2
+
+# ONNX exports (and their INT8 copies) are generated artifacts of several hundred MB each, so they go
+# next to the Hugging Face cache the weights come from rather than into the models package;
+# DIXII_ONNX_DIR overrides the location
+ONNX_EXPORT_DIR = os.getenv('DIXII_ONNX_DIR') or os.path.join(
+    os.getenv('HF_HOME') or os.path.join(os.path.expanduser('~'), '.cache', 'huggingface'), 'dixii-onnx'
+)
+
+# Learning files are written this many seconds after a manual input, so a burst of corrections
+# costs one write instead of one per input
+LEARNING_SAVE_DELAY = 2.0
+
+# Most recent manual inputs kept in the learning data; older ones are dropped on the next input
+MAX_MANUAL_INPUTS = 500
+
+# Both models see at most 512 tokens, two of them [CLS]/[SEP]. Every word is at least one token,
+# so words past this count are always truncated away - drop them before tokenizing
+MODEL_MAX_WORDS = 510
+
+def _label_runs(predictions, labels) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end (exclusive) indices of each run of consecutive predictions whose label is in
+    labels, found with one vectorised pass instead of a per-token Python loop
+    """
+    mask = np.isin(np.asarray(predictions), labels).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], mask, [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+@lru_cache(maxsize=4096)
+def _name_key(name: str) -> str:
+    """
+    Case- and surrounding-whitespace-insensitive key for deduplicating detected names; memoized,
+    since the same name usually comes from several methods and pages
+    """
+    return name.casefold().strip()
+
+def _has_name_shape(name: str) -> bool:
+    """
+    Two or more whitespace-separated parts, each starting with a capital letter in any script
+    (str.isupper, so Łukasz and Ömer count), and no digits anywhere
+    """
+    parts = name.split()
+    return len(parts) >= 2 and all(part[0].isupper() for part in parts) and not any(ch.isdigit() for ch in name)
+
+def _contains_exclude_term(name: str) -> bool:
+    """Whether name contains any of NAME_EXCLUDE_TERMS as a whole word, in any case"""
+    if NAME_EXCLUDE_AUTOMATON is None:
+        return NAME_EXCLUDE_RE.search(name) is not None
+    
+    name_lower = name.lower()
+    for end, term in NAME_EXCLUDE_AUTOMATON.iter(name_lower):
+        # Same word boundaries as NAME_EXCLUDE_RE
+        start = end - len(term) + 1
+        before = name_lower[start - 1] if start > 0 else ' '
+        after = name_lower[end + 1] if end + 1 < len(name_lower) else ' '
+        if not (before.isalnum() or before == '_') and not (after.isalnum() or after == '_'):
+            return True
+    return False
+
+def _bboxes_overlap(boxes1: np.ndarray, boxes2: np.ndarray, threshold: float = 0.3) -> np.ndarray:
+    """
+    (M, N) boolean matrix of which (x1, y1, x2, y2) boxes in the (M, 4) and (N, 4) arrays overlap
+    significantly: intersection at least threshold of the smaller box's area
+    """
+    x1 = np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    y1 = np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    x2 = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    y2 = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    smaller = np.minimum(area1[:, None], area2[None, :])
+    # Compare without dividing so degenerate (zero-area) boxes never match
+    return (intersection > 0) & (intersection >= threshold * smaller)
+
+def _target_overlaps_numpy(target: np.ndarray, boxes: np.ndarray, threshold: float = 0.3) -> np.ndarray:
+    """Boolean mask of which boxes in an (N, 4) array overlap one (4,) target box, as _bboxes_overlap"""
+    return _bboxes_overlap(target[None, :], boxes, threshold)[0]
+
+if njit is not None:
+    @njit(cache=True)
+    def _target_overlaps_jit(target, boxes, threshold=0.3):
+        # Same test as _target_overlaps_numpy in one compiled loop, without the NumPy temporaries
+        mask = np.zeros(boxes.shape[0], dtype=np.bool_)
+        tx1, ty1, tx2, ty2 = target[0], target[1], target[2], target[3]
+        target_area = (tx2 - tx1) * (ty2 - ty1)
+        for i in range(boxes.shape[0]):
+            bx1, by1, bx2, by2 = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
+            width = (tx2 if tx2 < bx2 else bx2) - (tx1 if tx1 > bx1 else bx1)
+            height = (ty2 if ty2 < by2 else by2) - (ty1 if ty1 > by1 else by1)
+            if width <= 0 or height <= 0:
+                continue
+            area = (bx2 - bx1) * (by2 - by1)
+            mask[i] = width * height >= threshold * (target_area if target_area < area else area)
+        return mask
+
+# Compiled kernel when numba is installed, otherwise the NumPy version
+_target_overlaps = _target_overlaps_jit if njit is not None else _target_overlaps_numpy
+
+@contextmanager
+def _replace_when_written(path: str):
+    """
+    Yield a temporary path next to path and move it into place once the block completes, so a
+    crash mid-write never leaves a truncated file at path; the temporary file is removed on failure
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _ocr_page(image_path: str) -> Optional[Tuple[Tuple[int, int], Dict]]:
+    """
+    Load the first page (PDFs rendered at 200 dpi) in greyscale and run tesseract once,
+    returning (image size, image_to_data dict), or None if the PDF has no pages.
+    Module-level so ProcessPoolExecutor workers can run it.
+    """
+    # Tesseract binarises internally and the models only use words and boxes, never pixels,
+    # so a single greyscale plane at 200 dpi loses nothing and is ~3x less data than 300 dpi RGB
+    if image_path.lower().endswith('.pdf'):
+        import pdf2image
+        images = pdf2image.convert_from_path(image_path, dpi=200, first_page=1, last_page=1, grayscale=True)
+        if not images:
+            return None
+        image = images[0]
+    else:
+        # Image.open only reads the header; draft asks the JPEG decoder for the luma plane alone,
+        # skipping chroma decoding and the RGB -> L conversion (a no-op for other formats)
+        image = Image.open(image_path)
+        image.draft('L', image.size)
+        image = image.convert("L")
+    
+    return image.size, pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+class _CompiledWithFallback:
+    """
+    A torch.compile'd model that switches to its eager module for good the first time a compiled
+    call raises. Compilation happens lazily on the first forward, so this is where it can fail;
+    the error is logged here instead of being hidden process-wide by dynamo's suppress_errors.
+    """
+    
+    def __init__(self, compiled, eager, logger):
+        self._compiled = compiled
+        self._eager = eager
+        self._logger = logger
+    
+    def __call__(self, *args, **kwargs):
+        compiled = self._compiled
+        if compiled is not None:
+            try:
+                return compiled(*args, **kwargs)
+            except Exception as e:
+                self._logger.warning(f"Compiled model failed, using eager mode: {e}")
+                self._compiled = None
+        return self._eager(*args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._eager, name)
 
 class EnhancedNameDetector:
     """
@@ -26,25 +267,71 @@ class EnhancedNameDetector:
     3. Rule-based fallback for tax document patterns
     """
     
+    # Loaded (tokenizer, model, ONNX session) shared by all instances, see _get_models
+    _shared_models = {}
+    _shared_models_lock = threading.Lock()
+    
     def __init__(self, models_dir: str = "models"):
         self.models_dir = models_dir
         self.logger = logging.getLogger(__name__)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         
-        # Initialize models
-        self.layoutlm_model = None
-        self.layoutlm_tokenizer = None
-        self.bert_ner_model = None
-        self.bert_ner_tokenizer = None
+        # Models are loaded on first use and shared by every detector with the same settings
+        # (see _shared_models); this instance's (tokenizer, model, ONNX session) per kind
+        self._models = {}
+        
+        # Export the models to ONNX Runtime sessions (see _load_onnx_session); when present they
+        # replace the eager PyTorch forward
+        self.use_onnx = ort is not None
+        
+        # On CPU, run the transformers with INT8 dynamic quantization of their Linear layers
+        # (weights stored as int8, activations quantized on the fly); ~2-4x faster forwards
+        self.quantize_on_cpu = True
+        
+        # On CUDA, run the PyTorch forwards under FP16 autocast (tensor cores, half the memory
+        # traffic); only the argmax of the logits is used, so the precision loss is immaterial
+        self.use_fp16 = True
+        
+        # On CUDA, compile the PyTorch models (fused kernels + CUDA graphs). LayoutLM and BERT NER
+        # input is then padded to a fixed 512 tokens so each compiled graph sees one shape and
+        # never recompiles or re-captures
+        self.compile_models = self.device.type == 'cuda' and hasattr(torch, 'compile')
+        
+        # Pages per BERT NER forward in detect_names_in_documents (512-token sequences each)
+        self.ner_batch_size = 8
+        
+        # LRU cache of detect_names_in_document results keyed by page content (see _result_cache_key)
+        self._result_cache = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        
+        # Recent OCR output by file identity (see _extract_ocr_once)
+        self._ocr_memo = OrderedDict()
+        self._ocr_memo_lock = threading.Lock()
+        
+        # Per-thread reusable LayoutLM bbox input buffers, keyed by (sequence length, device)
+        self._bbox_pool = threading.local()
+        
+        # Process pool for OCR in detect_names_in_documents, created on first use
+        self._ocr_pool = None
+        self._ocr_pool_lock = threading.Lock()
+        
+        # Run LayoutLM on a worker thread alongside BERT NER (see _detect_names_from_ocr); not
+        # done for compiled models, see _runs_compiled_graphs
+        self.parallel_methods = True
+        self._method_pool = None
+        self._method_pool_lock = threading.Lock()
         
         # Learning system
         self.learning_data_file = os.path.join(models_dir, "name_learning_data.json")
         self.location_patterns_file = os.path.join(models_dir, "location_patterns.json")
         self.learning_data = self._load_learning_data()
         self.location_patterns = self._load_location_patterns()
-        
-        # Load models
-        self._load_models()
+        # Per doc_type (boxes array, names) view of location_patterns (see _location_pattern_arrays)
+        self._pattern_arrays = {}
+        # Guards learning_data/location_patterns against the delayed save (see _schedule_learning_save)
+        self._learning_lock = threading.Lock()
+        self._learning_dirty = False
+        self._learning_save_timer = None
         
         # Tax document name patterns
         self.tax_name_patterns = {
@@ -110,52 +397,320 @@ class EnhancedNameDetector:
                 r'\b([A-Z][a-z]+\s+[A-Z][a-z]+)\s+(?:LLC|Corp|Inc|Co|Trust|Estate)\b'
             ]
         }
+        
+        # Compiled once here rather than re-parsed by re.finditer on every document
+        self.tax_name_patterns = {
+            category: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for category, patterns in self.tax_name_patterns.items()
+        }
+        
+        # Person name patterns used by _detect_names_patterns, most specific first, each with the
+        # literal words (lower-case) it cannot match without; None means it always runs. Every
+        # capture group is one name - titles and roles are non-capturing. The contextual patterns
+        # that can match on a page are fused into one alternation so the OCR text is scanned once
+        # for all of them; the bare name patterns (None) each get their own pass, so names inside
+        # or overlapping a contextual match are still found
+        context_words = ('partner', 'recipient', 'employee', 'taxpayer', 'borrower')
+        self._person_name_patterns = [
+            # Names with titles
+            (r'(?:Mr\.|Mrs\.|Ms\.|Dr\.) ([A-Z][a-z]+ [A-Z][a-z]+)', ('mr.', 'mrs.', 'ms.', 'dr.')),
+            # Names in specific contexts
+            (r'(?:Partner|Recipient|Employee|Taxpayer|Borrower): ([A-Z][a-z]+ [A-Z][a-z]+)', context_words),
+            (r'([A-Z][a-z]+ [A-Z][a-z]+) (?:Partner|Recipient|Employee|Taxpayer|Borrower)', context_words),
+            # Trust beneficiary patterns
+            (r'([A-Z][a-z]+ [A-Z][a-z]+) Trust', ('trust',)),
+            (r'Trust of ([A-Z][a-z]+ [A-Z][a-z]+)', ('trust',)),
+            # Partnership patterns
+            (r'([A-Z][a-z]+ [A-Z][a-z]+) & ([A-Z][a-z]+ [A-Z][a-z]+)', ('&',)),
+            (r'([A-Z][a-z]+ [A-Z][a-z]+) AND ([A-Z][a-z]+ [A-Z][a-z]+)', ('and',)),
+            # Individual names with proper capitalization
+            (r'([A-Z][a-z]+ [A-Z][a-z]+ [A-Z][a-z]+)', None),  # First Middle Last
+            (r'([A-Z][a-z]+ [A-Z][a-z]+)', None),
+        ]
+        self._build_person_name_prefilter()
+    
+    def _build_person_name_prefilter(self):
+        """
+        Map every trigger word to the patterns that need it, so a page only runs the patterns
+        whose words appear in it: an Aho-Corasick automaton when pyahocorasick is installed,
+        otherwise one regex alternation. Fused regexes are compiled once per set of active patterns.
+        """
+        self._trigger_patterns = {}
+        self._bare_person_name_res = []
+        for i, (pattern, triggers) in enumerate(self._person_name_patterns):
+            if triggers is None:
+                self._bare_person_name_res.append((pattern, re.compile(pattern, re.IGNORECASE)))
+                continue
+            for trigger in triggers:
+                self._trigger_patterns.setdefault(trigger, []).append(i)
+        
+        self._trigger_automaton = None
+        self._trigger_re = None
+        if ahocorasick is not None:
+            self._trigger_automaton = ahocorasick.Automaton()
+            for trigger in self._trigger_patterns:
+                self._trigger_automaton.add_word(trigger, trigger)
+            self._trigger_automaton.make_automaton()
+        else:
+            # Lookahead so overlapping triggers (ms. inside mrs.) are all seen
+            self._trigger_re = re.compile(
+                '(?=(' + '|'.join(map(re.escape, self._trigger_patterns)) + '))'
+            )
+        self._fused_person_name_res = {}
+    
+    def _active_person_name_patterns(self, text: str) -> Tuple[int, ...]:
+        """Indices of the contextual person name patterns that can match text, in priority order"""
+        text_lower = text.lower()
+        if self._trigger_automaton is not None:
+            found = {trigger for _, trigger in self._trigger_automaton.iter(text_lower)}
+        else:
+            found = {m.group(1) for m in self._trigger_re.finditer(text_lower)}
+        
+        active = set()
+        for trigger in found:
+            active.update(self._trigger_patterns[trigger])
+        return tuple(sorted(active))
     
-    def _load_models(self):
-        """Load the specialized models for name detection"""
+    def _fused_person_name_re(self, active: Tuple[int, ...]):
+        """
+        Fused regex over the given patterns plus a map of group name ->
+        (source pattern, indices of its capture groups in the fused pattern)
+        """
+        fused = self._fused_person_name_res.get(active)
+        if fused is None:
+            patterns = [self._person_name_patterns[i][0] for i in active]
+            regex = re.compile(
+                '|'.join(f'(?P<p{i}>{pattern})' for i, pattern in enumerate(patterns)),
+                re.IGNORECASE
+            )
+            groups = {}
+            for i, pattern in enumerate(patterns):
+                start = regex.groupindex[f'p{i}'] + 1
+                groups[f'p{i}'] = (pattern, range(start, start + re.compile(pattern).groups))
+            fused = self._fused_person_name_res.setdefault(active, (regex, groups))
+        return fused
+    
+    @property
+    def layoutlm_tokenizer(self):
+        return self._get_models('layoutlm')[0]
+    
+    @property
+    def layoutlm_model(self):
+        return self._get_models('layoutlm')[1]
+    
+    @property
+    def layoutlm_session(self):
+        return self._get_models('layoutlm')[2]
+    
+    @property
+    def bert_ner_tokenizer(self):
+        return self._get_models('bert_ner')[0]
+    
+    @property
+    def bert_ner_model(self):
+        return self._get_models('bert_ner')[1]
+    
+    @property
+    def bert_ner_session(self):
+        return self._get_models('bert_ner')[2]
+    
+    def _get_models(self, kind: str) -> Tuple:
+        """
+        (tokenizer, model, ONNX session) for 'layoutlm' or 'bert_ner', loaded on first use.
+        Loaded models are kept at class level keyed by kind and the settings that shape them,
+        so other detectors in the process reuse them instead of loading the weights again.
+        All three are None when the model could not be loaded.
+        """
+        models = self._models.get(kind)
+        if models is not None:
+            return models
+        
+        key = (kind, str(self.device), self.models_dir, self.use_onnx, self.quantize_on_cpu,
+               self.compile_models)
+        with EnhancedNameDetector._shared_models_lock:
+            models = EnhancedNameDetector._shared_models.get(key)
+            if models is None:
+                loader = self._load_layoutlm if kind == 'layoutlm' else self._load_bert_ner
+                models = EnhancedNameDetector._shared_models[key] = loader()
+        
+        self._models[kind] = models
+        return models
+    
+    def _load_layoutlm(self) -> Tuple:
+        """Load LayoutLM for document-specific name detection"""
         try:
-            # Load LayoutLM for document-specific name detection
             # Use a more appropriate model or handle the base model properly
-            self.layoutlm_tokenizer = LayoutLMTokenizer.from_pretrained("microsoft/layoutlm-base-uncased")
-            self.layoutlm_model = LayoutLMForTokenClassification.from_pretrained(
+            tokenizer = LayoutLMTokenizer.from_pretrained("microsoft/layoutlm-base-uncased")
+            model = LayoutLMForTokenClassification.from_pretrained(
                 "microsoft/layoutlm-base-uncased",
                 num_labels=2  # Binary classification: name vs not-name
             )
-            self.layoutlm_model.to(self.device)
-            self.layoutlm_model.eval()
+            model.to(self.device)
+            model.eval()
             self.logger.info("LayoutLM model loaded successfully")
             
+            session = None
+            if self.use_onnx:
+                session = self._load_onnx_session(
+                    "layoutlm-base-uncased", model, ('input_ids', 'bbox', 'attention_mask')
+                )
+            if session is None:
+                model = self._compile_for_gpu(self._quantize_for_cpu(model))
+            return tokenizer, model, session
+            
         except Exception as e:
             self.logger.warning(f"Could not load LayoutLM model: {e}")
             self.logger.info("LayoutLM will be disabled - using pattern-based detection only")
-            self.layoutlm_model = None
-            self.layoutlm_tokenizer = None
-        
+            return None, None, None
+    
+    def _load_bert_ner(self) -> Tuple:
+        """Load BERT NER for general name recognition"""
         try:
-            # Load BERT NER for general name recognition
             # Use a more appropriate model for person name detection
-            self.bert_ner_tokenizer = BertTokenizer.from_pretrained("dbmdz/bert-large-cased-finetuned-conll03-english")
-            self.bert_ner_model = BertForTokenClassification.from_pretrained("dbmdz/bert-large-cased-finetuned-conll03-english")
-            self.bert_ner_model.to(self.device)
-            self.bert_ner_model.eval()
+            tokenizer = BertTokenizer.from_pretrained("dbmdz/bert-large-cased-finetuned-conll03-english")
+            model = BertForTokenClassification.from_pretrained("dbmdz/bert-large-cased-finetuned-conll03-english")
+            model.to(self.device)
+            model.eval()
             self.logger.info("BERT NER model loaded successfully")
             
+            session = None
+            if self.use_onnx:
+                session = self._load_onnx_session(
+                    "bert-large-cased-finetuned-conll03-english", model,
+                    ('input_ids', 'attention_mask')
+                )
+            if session is None:
+                model = self._compile_for_gpu(self._quantize_for_cpu(model))
+            return tokenizer, model, session
+            
         except Exception as e:
             self.logger.warning(f"Could not load BERT NER model: {e}")
             self.logger.info("BERT NER will be disabled - using pattern-based detection only")
-            self.bert_ner_model = None
-            self.bert_ner_tokenizer = None
-        
-        # Log which models are available
-        available_models = []
-        if self.layoutlm_model:
-            available_models.append("LayoutLM")
-        if self.bert_ner_model:
-            available_models.append("BERT NER")
-        if not available_models:
-            self.logger.warning("No ML models loaded - will rely on pattern-based detection only")
+            return None, None, None
+    
+    def _load_onnx_session(self, name: str, model, input_names: Tuple[str, ...]):
+        """
+        Export model to ONNX_EXPORT_DIR/<name>.onnx on first use and open it with ONNX Runtime's full
+        graph optimizations (fused attention/LayerNorm/GELU kernels). Returns None on failure,
+        in which case the PyTorch model is used.
+        """
+        onnx_path = os.path.join(ONNX_EXPORT_DIR, f"{name}.onnx")
+        try:
+            if not os.path.exists(onnx_path):
+                # Dummy batch of 1 x 8 tokens; batch and sequence axes are exported as dynamic
+                dummy = {input_name: torch.ones((1, 8), dtype=torch.long, device=self.device)
+                         for input_name in input_names}
+                if 'bbox' in dummy:
+                    dummy['bbox'] = torch.zeros((1, 8, 4), dtype=torch.long, device=self.device)
+                
+                os.makedirs(ONNX_EXPORT_DIR, exist_ok=True)
+                with _replace_when_written(onnx_path) as temp_path, torch.no_grad():
+                    torch.onnx.export(
+                        model,
+                        tuple(dummy[input_name] for input_name in input_names),
+                        temp_path,
+                        input_names=list(input_names),
+                        output_names=['logits'],
+                        dynamic_axes={input_name: {0: 'batch', 1: 'sequence'} for input_name in input_names},
+                        opset_version=17
+                    )
+                self.logger.info(f"Exported {name} to ONNX: {onnx_path}")
+            
+            if self.quantize_on_cpu and self.device.type == 'cpu':
+                onnx_path = self._quantized_onnx_path(name, onnx_path)
+            
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            available = ort.get_available_providers()
+            providers = [provider for provider in ('CUDAExecutionProvider', 'CPUExecutionProvider')
+                         if provider in available]
+            session = ort.InferenceSession(onnx_path, sess_options=options, providers=providers)
+            self.logger.info(f"ONNX Runtime session for {name} ready ({', '.join(session.get_providers())})")
+            return session
+            
+        except Exception as e:
+            self.logger.warning(f"Could not set up ONNX Runtime for {name}, using PyTorch: {e}")
+            return None
+    
+    def _quantized_onnx_path(self, name: str, onnx_path: str) -> str:
+        """INT8 copy of an exported model, quantized once and kept next to it; the FP32 path on failure"""
+        int8_path = os.path.join(ONNX_EXPORT_DIR, f"{name}.int8.onnx")
+        if os.path.exists(int8_path):
+            return int8_path
+        
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            with _replace_when_written(int8_path) as temp_path:
+                quantize_dynamic(onnx_path, temp_path, weight_type=QuantType.QInt8)
+            self.logger.info(f"Quantized {name} to INT8: {int8_path}")
+            return int8_path
+        except Exception as e:
+            self.logger.warning(f"Could not quantize {name}, using FP32 ONNX model: {e}")
+            return onnx_path
+    
+    def _quantize_for_cpu(self, model):
+        """Dynamically quantize a PyTorch model's Linear layers to INT8 when running on CPU"""
+        if not self.quantize_on_cpu or self.device.type != 'cpu':
+            return model
+        
+        try:
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            self.logger.warning(f"Could not quantize model for CPU, using FP32: {e}")
+            return model
+    
+    def _compile_for_gpu(self, model):
+        """torch.compile a model when compile_models is set; compilation problems fall back to eager"""
+        if not self.compile_models:
+            return model
+        
+        try:
+            return _CompiledWithFallback(torch.compile(model, mode='reduce-overhead'), model, self.logger)
+        except Exception as e:
+            self.logger.warning(f"Could not compile model, using eager mode: {e}")
+            return model
+    
+    def _to_device(self, tensor: torch.Tensor, session=None) -> torch.Tensor:
+        """
+        Move a model input to self.device. CUDA copies go through pinned host memory with
+        non_blocking=True so the transfer overlaps other GPU work; inputs for an ONNX session
+        stay on the host, where session.run reads them.
+        """
+        if session is not None or self.device.type != 'cuda':
+            return tensor
+        return tensor.pin_memory().to(self.device, non_blocking=True)
+    
+    def _bbox_buffer(self, seq_len: int, device: torch.device) -> torch.Tensor:
+        """
+        Zeroed (1, seq_len, 4) int64 bbox buffer, allocated once per shape and device and reused
+        by later pages in the same thread instead of allocating, padding and concatenating each time
+        """
+        buffers = getattr(self._bbox_pool, 'buffers', None)
+        if buffers is None:
+            buffers = self._bbox_pool.buffers = {}
+        
+        buffer = buffers.get((seq_len, device))
+        if buffer is None:
+            buffer = buffers[(seq_len, device)] = torch.zeros((1, seq_len, 4), dtype=torch.long, device=device)
         else:
-            self.logger.info(f"Available models: {', '.join(available_models)}")
+            buffer.zero_()
+        return buffer
+    
+    def _token_predictions(self, model, session, inputs: Dict[str, torch.Tensor], squeeze: bool = True) -> np.ndarray:
+        """
+        Per-token argmax labels, from the ONNX session when available. Shape (batch, sequence),
+        squeezed for a single sequence unless squeeze=False.
+        """
+        if session is not None:
+            logits = session.run(['logits'], {name: tensor.cpu().numpy() for name, tensor in inputs.items()})[0]
+            predictions = logits.argmax(-1)
+        else:
+            use_autocast = self.use_fp16 and self.device.type == 'cuda'
+            with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16,
+                                                 enabled=use_autocast):
+                outputs = model(**inputs)
+            predictions = outputs.logits.argmax(-1).cpu().numpy()
+        return predictions.squeeze() if squeeze else predictions
     
     def detect_names_in_document(self, image_path: str, doc_type: str = None) -> Dict:
         """
@@ -168,15 +723,7 @@ class EnhancedNameDetector:
         Returns:
             Dictionary with detected names and confidence scores
         """
-        results = {
-            'layoutlm_names': [],
-            'bert_ner_names': [],
-            'pattern_names': [],
-            'location_names': [],
-            'combined_names': [],
-            'confidence': 0.0,
-            'detection_methods': []
-        }
+        results = self._empty_results()
         
         try:
             # Validate input
@@ -184,76 +731,282 @@ class EnhancedNameDetector:
                 self.logger.error(f"Invalid image path: {image_path}")
                 return results
             
-            # Method 1: LayoutLM for document-specific detection
-            if self.layoutlm_model and self.layoutlm_tokenizer:
-                try:
-                    layoutlm_results = self._detect_names_layoutlm(image_path)
-                    results['layoutlm_names'] = layoutlm_results
-                    results['detection_methods'].append('layoutlm')
-                    self.logger.info(f"LayoutLM detected {len(layoutlm_results)} names")
-                except Exception as e:
-                    self.logger.error(f"LayoutLM detection failed: {e}")
-                    results['layoutlm_names'] = []
-            
-            # Method 2: BERT NER for general name recognition
-            if self.bert_ner_model and self.bert_ner_tokenizer:
-                try:
-                    bert_results = self._detect_names_bert_ner(image_path)
-                    results['bert_ner_names'] = bert_results
-                    results['detection_methods'].append('bert_ner')
-                    self.logger.info(f"BERT NER detected {len(bert_results)} names")
-                except Exception as e:
-                    self.logger.error(f"BERT NER detection failed: {e}")
-                    results['bert_ner_names'] = []
-            
-            # Method 3: Pattern-based detection for tax documents
-            if doc_type:
-                try:
-                    pattern_results = self._detect_names_patterns(image_path, doc_type)
-                    results['pattern_names'] = pattern_results
-                    results['detection_methods'].append('patterns')
-                    self.logger.info(f"Pattern detection found {len(pattern_results)} names")
-                except Exception as e:
-                    self.logger.error(f"Pattern detection failed: {e}")
-                    results['pattern_names'] = []
+            if not self._has_detection_methods(doc_type):
+                return results
             
-            # Method 4: Location-based detection using learned patterns
-            if doc_type:
-                try:
-                    location_results = self._detect_names_by_location(image_path, doc_type)
-                    results['location_names'] = location_results
-                    results['detection_methods'].append('location_pattern')
-                    self.logger.info(f"Location-based detection found {len(location_results)} names")
-                except Exception as e:
-                    self.logger.error(f"Location-based detection failed: {e}")
-                    results['location_names'] = []
+            # Re-runs over the same page skip OCR and both transformer forwards
+            cache_key = self._result_cache_key(image_path, doc_type)
+            cached = self._get_cached_result(cache_key)
+            if cached is not None:
+                return cached
             
-            # Combine and rank results
-            results['combined_names'] = self._combine_name_results(results)
-            results['confidence'] = self._calculate_confidence(results)
+            # Decode and OCR the page once; every method works from the same output
+            image_size, ocr_results, text = self._extract_ocr_once(image_path)
+            if image_size is None:
+                return results
             
+            results = self._detect_names_from_ocr(image_size, ocr_results, text, doc_type)
+            self._store_cached_result(cache_key, results)
             return results
             
         except Exception as e:
             self.logger.error(f"Error in name detection: {e}")
             return results
     
-    def _detect_names_layoutlm(self, image_path: str) -> List[Dict]:
-        """Detect names using LayoutLM model"""
-        try:
-            # Load and preprocess image (handle PDFs)
-            if image_path.lower().endswith('.pdf'):
-                import pdf2image
-                images = pdf2image.convert_from_path(image_path, dpi=300)
-                if not images:
-                    return []
-                image = images[0].convert("RGB")
+    def detect_names_in_documents(self, image_paths: List[str], doc_type: str = None) -> Dict[str, Dict]:
+        """
+        detect_names_in_document for many pages at once. Page decoding and tesseract run in a
+        pool of worker processes (one per CPU) instead of one page at a time; the models then
+        run in this process on the OCR output.
+        
+        Returns:
+            Dictionary mapping each image path to its detection results
+        """
+        if not self._has_detection_methods(doc_type):
+            return {image_path: self._empty_results() for image_path in image_paths}
+        
+        all_results = {}
+        misses = {}
+        for image_path in image_paths:
+            if not image_path or not os.path.exists(image_path):
+                all_results[image_path] = self.detect_names_in_document(image_path, doc_type)
+                continue
+            try:
+                cache_key = self._result_cache_key(image_path, doc_type)
+            except OSError as e:
+                self.logger.error(f"Could not read {image_path} for name detection: {e}")
+                all_results[image_path] = self._empty_results()
+                continue
+            cached = self._get_cached_result(cache_key)
+            if cached is not None:
+                all_results[image_path] = cached
             else:
-                image = Image.open(image_path).convert("RGB")
-            width, height = image.size
+                misses[image_path] = cache_key
+        
+        if len(misses) == 1:
+            # Not worth a round trip to the pool
+            image_path = next(iter(misses))
+            all_results[image_path] = self.detect_names_in_document(image_path, doc_type)
+            return all_results
+        
+        if misses:
+            # Pages already OCRed (memo or disk, see _lookup_ocr) skip the pool
+            pages = {}
+            ocr_keys = {}
+            for image_path in misses:
+                try:
+                    memo_key, ocr_cache_key, page = self._lookup_ocr(image_path)
+                except OSError as e:
+                    self.logger.error(f"Could not OCR {image_path} for name detection: {e}")
+                    all_results[image_path] = self._empty_results()
+                    continue
+                if page is not None:
+                    pages[image_path] = page
+                else:
+                    ocr_keys[image_path] = (memo_key, ocr_cache_key)
+            
+            if ocr_keys:
+                pool = self._get_ocr_pool()
+                futures = {image_path: pool.submit(_ocr_page, image_path) for image_path in ocr_keys}
+                for image_path, future in futures.items():
+                    try:
+                        ocr_page = future.result()
+                    except Exception as e:
+                        self.logger.error(f"Could not OCR {image_path} for name detection: {e}")
+                        ocr_page = None
+                    if ocr_page is None:
+                        all_results[image_path] = self._empty_results()
+                        continue
+                    
+                    pages[image_path] = self._remember_ocr(*ocr_keys[image_path], ocr_page)
+            
+            # BERT NER runs over all pages in padded mini-batches rather than one forward per page
+            bert_ner_names = {}
+            if self.bert_ner_model is not None and self.bert_ner_tokenizer is not None:
+                texts = [text for _, _, text in pages.values()]
+                bert_ner_names = dict(zip(pages, self._detect_names_bert_ner_batch(texts)))
+            
+            for image_path, (image_size, ocr_results, text) in pages.items():
+                results = self._detect_names_from_ocr(image_size, ocr_results, text, doc_type,
+                                                      bert_ner_names.get(image_path))
+                self._store_cached_result(misses[image_path], results)
+                all_results[image_path] = results
+        
+        return all_results
+    
+    def _get_ocr_pool(self) -> ProcessPoolExecutor:
+        """Process pool for detect_names_in_documents, created on first use and kept for later batches"""
+        with self._ocr_pool_lock:
+            if self._ocr_pool is None:
+                # spawn rather than fork: forking a process holding torch/tokenizer threads can
+                # deadlock the children on inherited locks
+                self._ocr_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(), mp_context=multiprocessing.get_context('spawn')
+                )
+                atexit.register(self.close)
+            return self._ocr_pool
+    
+    def close(self):
+        """Shut down the OCR worker processes and method threads, if started; also registered with atexit"""
+        with self._ocr_pool_lock:
+            ocr_pool, self._ocr_pool = self._ocr_pool, None
+        with self._method_pool_lock:
+            method_pool, self._method_pool = self._method_pool, None
+        for pool in (ocr_pool, method_pool):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _get_method_pool(self) -> ThreadPoolExecutor:
+        """Thread pool for detection methods run alongside BERT NER, created on first use"""
+        with self._method_pool_lock:
+            if self._method_pool is None:
+                self._method_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='name-detection')
+            return self._method_pool
+    
+    def _has_detection_methods(self, doc_type: str = None) -> bool:
+        """Whether any detection method would run - if not, there is no point decoding the page"""
+        return bool(self.layoutlm_model is not None or self.bert_ner_model is not None or doc_type)
+    
+    def _empty_results(self) -> Dict:
+        """Detection results with nothing found"""
+        return {
+            'layoutlm_names': [],
+            'bert_ner_names': [],
+            'pattern_names': [],
+            'location_names': [],
+            'combined_names': [],
+            'confidence': 0.0,
+            'detection_methods': []
+        }
+    
+    def _detect_names_from_ocr(self, image_size: Tuple[int, int], ocr_results: List[Dict], text: str,
+                               doc_type: str = None, bert_ner_names: Optional[List[Dict]] = None) -> Dict:
+        """
+        Run every available detection method on one page's OCR output and combine the results.
+        bert_ner_names, when given, are BERT NER results already computed in a batch.
+        """
+        results = self._empty_results()
+        run_layoutlm = self.layoutlm_model is not None and self.layoutlm_tokenizer is not None
+        run_bert_ner = self.bert_ner_model is not None and self.bert_ner_tokenizer is not None
+        
+        # When both models run on this page, LayoutLM runs on a worker thread while BERT NER runs
+        # here; PyTorch and ONNX Runtime release the GIL, so the two forwards overlap
+        layoutlm_future = None
+        if (self.parallel_methods and run_layoutlm and run_bert_ner and bert_ner_names is None
+                and not self._runs_compiled_graphs()):
+            layoutlm_future = self._get_method_pool().submit(self._detect_names_layoutlm, image_size, ocr_results)
+        
+        if run_bert_ner and bert_ner_names is None:
+            try:
+                bert_ner_names = self._detect_names_bert_ner(text)
+            except Exception as e:
+                self.logger.error(f"BERT NER detection failed: {e}")
+        
+        # Method 1: LayoutLM for document-specific detection
+        if run_layoutlm:
+            try:
+                if layoutlm_future is not None:
+                    layoutlm_results = layoutlm_future.result()
+                else:
+                    layoutlm_results = self._detect_names_layoutlm(image_size, ocr_results)
+                results['layoutlm_names'] = layoutlm_results
+                results['detection_methods'].append('layoutlm')
+                self.logger.info(f"LayoutLM detected {len(layoutlm_results)} names")
+            except Exception as e:
+                self.logger.error(f"LayoutLM detection failed: {e}")
+                results['layoutlm_names'] = []
+        
+        # Method 2: BERT NER for general name recognition (run above, or already computed in a batch)
+        if run_bert_ner and bert_ner_names is not None:
+            results['bert_ner_names'] = bert_ner_names
+            results['detection_methods'].append('bert_ner')
+            self.logger.info(f"BERT NER detected {len(bert_ner_names)} names")
+        
+        # Method 3: Pattern-based detection for tax documents
+        if doc_type:
+            try:
+                pattern_results = self._detect_names_patterns(text, doc_type)
+                results['pattern_names'] = pattern_results
+                results['detection_methods'].append('patterns')
+                self.logger.info(f"Pattern detection found {len(pattern_results)} names")
+            except Exception as e:
+                self.logger.error(f"Pattern detection failed: {e}")
+                results['pattern_names'] = []
+        
+        # Method 4: Location-based detection using learned patterns
+        if doc_type:
+            try:
+                location_results = self._detect_names_by_location(image_size, ocr_results, doc_type)
+                results['location_names'] = location_results
+                results['detection_methods'].append('location_pattern')
+                self.logger.info(f"Location-based detection found {len(location_results)} names")
+            except Exception as e:
+                self.logger.error(f"Location-based detection failed: {e}")
+                results['location_names'] = []
+        
+        # Combine and rank results
+        results['combined_names'] = self._combine_name_results(results)
+        results['confidence'] = self._calculate_confidence(results)
+        
+        return results
+    
+    def _result_cache_key(self, image_path: str, doc_type: str = None) -> str:
+        """
+        Hex key from the page bytes, doc_type, which models are loaded and the learned location
+        patterns for doc_type, so learning from a manual input invalidates that type's entries
+        """
+        key = hashlib.blake2b(digest_size=16)
+        location_names = self.location_patterns['form_types'].get(doc_type, {}).get('name_locations', [])
+        last_learned = location_names[-1]['timestamp'] if location_names else ''
+        key.update(f"{NAME_CACHE_VERSION}|{doc_type or ''}|{self.layoutlm_model is not None}|"
+                   f"{self.bert_ner_model is not None}|{len(location_names)}|{last_learned}|".encode())
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                key.update(chunk)
+        return key.hexdigest()
+    
+    def _get_cached_result(self, cache_key: str) -> Optional[Dict]:
+        """Return a copy of cached detection results from memory or disk, or None"""
+        with self._result_cache_lock:
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                self._result_cache.move_to_end(cache_key)
+                return copy.deepcopy(cached)
+        
+        if NAME_CACHE_DIR is None:
+            return None
+        try:
+            with open(os.path.join(NAME_CACHE_DIR, f"{cache_key}.json"), 'rb') as f:
+                cached = _json_loads(f.read())
+        except (OSError, ValueError):
+            return None
+        
+        self._remember_result(cache_key, cached)
+        return cached
+    
+    def _store_cached_result(self, cache_key: str, results: Dict):
+        """Store detection results in memory and on disk (best-effort, failures are only logged)"""
+        self._remember_result(cache_key, results)
+        if NAME_CACHE_DIR is None:
+            return
+        cache_file = os.path.join(NAME_CACHE_DIR, f"{cache_key}.json")
+        try:
+            write_cache_file(cache_file, json.dumps(results))
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.debug(f"Could not write name detection cache file {cache_file}: {e}")
+    
+    def _remember_result(self, cache_key: str, results: Dict):
+        """Add results to the in-memory LRU, evicting the least recently used entry when full"""
+        with self._result_cache_lock:
+            self._result_cache[cache_key] = copy.deepcopy(results)
+            if len(self._result_cache) > NAME_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+    
+    def _detect_names_layoutlm(self, image_size: Tuple[int, int], ocr_results: List[Dict]) -> List[Dict]:
+        """Detect names using LayoutLM model on the page's OCR words/boxes (image_size is (width, height))"""
+        try:
+            width, height = image_size
             
-            # Run OCR to get text and bounding boxes
-            ocr_results = self._run_ocr_with_boxes(image)
             if not ocr_results:
                 self.logger.warning("No OCR results obtained for LayoutLM processing")
                 return []
@@ -274,40 +1027,22 @@ class EnhancedNameDetector:
             if not words or not boxes:
                 self.logger.warning("No valid words or boxes found for LayoutLM processing")
                 return []
+            words = words[:MODEL_MAX_WORDS]
+            boxes = boxes[:MODEL_MAX_WORDS]
             
-            # Normalize boxes to 1000x1000
-            normalized_boxes = []
-            for i, box in enumerate(boxes):
-                try:
-                    # Debug: log original box values
-                    self.logger.debug(f"Original box {i}: {box}, width: {width}, height: {height}")
-                    
-                    # Ensure values are within 0-1000 range
-                    x0 = max(0, min(1000, int(1000 * box[0] / width)))
-                    y0 = max(0, min(1000, int(1000 * box[1] / height)))
-                    x1 = max(0, min(1000, int(1000 * box[2] / width)))
-                    y1 = max(0, min(1000, int(1000 * box[3] / height)))
-                    
-                    # Ensure x1 > x0 and y1 > y0
-                    x1 = max(x1, x0 + 1)
-                    y1 = max(y1, y0 + 1)
-                    
-                    normalized_box = [x0, y0, x1, y1]
-                    normalized_boxes.append(normalized_box)
-                    
-                    # Debug: log normalized box values
-                    self.logger.debug(f"Normalized box {i}: {normalized_box}")
-                    
-                except (TypeError, ValueError, ZeroDivisionError) as e:
-                    self.logger.warning(f"Error normalizing box {box}: {e}")
-                    continue
-            
-            if not normalized_boxes:
-                self.logger.warning("No valid normalized boxes for LayoutLM processing")
+            # Normalize boxes to 1000x1000 in one array expression: scale, truncate, clamp to 0-1000,
+            # then ensure x1 > x0 and y1 > y0
+            if not width or not height:
+                self.logger.warning(f"Invalid image size for LayoutLM processing: {image_size}")
                 return []
+            page_size = np.array([width, height, width, height], dtype=np.float64)
+            normalized_boxes = (np.asarray(boxes, dtype=np.float64) * 1000 / page_size).astype(np.int64)
+            np.clip(normalized_boxes, 0, 1000, out=normalized_boxes)
+            normalized_boxes[:, 2] = np.maximum(normalized_boxes[:, 2], normalized_boxes[:, 0] + 1)
+            normalized_boxes[:, 3] = np.maximum(normalized_boxes[:, 3], normalized_boxes[:, 1] + 1)
             
             # Debug: log all normalized boxes
-            self.logger.debug(f"All normalized boxes: {normalized_boxes[:5]}...")  # Show first 5
+            self.logger.debug(f"All normalized boxes: {normalized_boxes[:5].tolist()}...")  # Show first 5
             
             # Tokenize with proper padding and truncation
             # LayoutLM tokenizer expects boxes as a list of lists, not as a keyword argument
@@ -315,43 +1050,31 @@ class EnhancedNameDetector:
                 words,
                 return_tensors="pt",
                 truncation=True,
-                padding=True,
+                padding='max_length' if self._layoutlm_static_shapes() else True,
                 max_length=512
             )
             
-            # Add boxes manually since LayoutLM tokenizer doesn't accept boxes parameter
-            # We need to create the bbox tensor manually
-            bbox_tensor = torch.tensor(normalized_boxes).to(self.device)
-            
-            # Ensure bbox tensor has the correct shape for LayoutLM
-            # LayoutLM expects bbox to have shape (batch_size, sequence_length, 4)
-            if len(bbox_tensor.shape) == 2:
-                bbox_tensor = bbox_tensor.unsqueeze(0)  # Add batch dimension
-            
             # Move to device
-            input_ids = encoding["input_ids"].to(self.device)
-            attention_mask = encoding["attention_mask"].to(self.device)
-            
-            # Ensure bbox tensor matches input_ids length
-            # If bbox tensor is shorter than input_ids, pad with zeros
-            if bbox_tensor.shape[1] < input_ids.shape[1]:
-                padding_length = input_ids.shape[1] - bbox_tensor.shape[1]
-                padding = torch.zeros((1, padding_length, 4), device=self.device)
-                bbox_tensor = torch.cat([bbox_tensor, padding], dim=1)
-            elif bbox_tensor.shape[1] > input_ids.shape[1]:
-                # Truncate bbox tensor to match input_ids
-                bbox_tensor = bbox_tensor[:, :input_ids.shape[1], :]
+            input_ids = self._to_device(encoding["input_ids"], self.layoutlm_session)
+            attention_mask = self._to_device(encoding["attention_mask"], self.layoutlm_session)
+            
+            # Add boxes manually since LayoutLM tokenizer doesn't accept boxes parameter.
+            # LayoutLM expects bbox to have shape (batch_size, sequence_length, 4): copy the boxes
+            # into a reused zeroed buffer of that shape, which pads or truncates them to match input_ids
+            seq_len = input_ids.shape[1]
+            box_count = min(len(normalized_boxes), seq_len)
+            bbox_tensor = self._bbox_buffer(seq_len, input_ids.device)
+            bbox_tensor[0, :box_count].copy_(
+                self._to_device(torch.from_numpy(normalized_boxes[:box_count]), self.layoutlm_session),
+                non_blocking=True
+            )
             
             # Get predictions
-            with torch.no_grad():
-                outputs = self.layoutlm_model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    bbox=bbox_tensor
-                )
-            
-            # Process predictions
-            predictions = outputs.logits.argmax(-1).squeeze().cpu().numpy()
+            predictions = self._token_predictions(self.layoutlm_model, self.layoutlm_session, {
+                'input_ids': input_ids,
+                'bbox': bbox_tensor,
+                'attention_mask': attention_mask
+            })
             
             # Handle different prediction shapes
             if len(predictions.shape) == 0:
@@ -366,32 +1089,18 @@ class EnhancedNameDetector:
             
             # Extract names based on predictions (binary classification: 0 = not name, 1 = name)
             names = []
-            current_name = []
-            
-            for i, (word, pred) in enumerate(zip(words, predictions)):
-                if pred == 1:  # Name label
-                    current_name.append(word)
-                elif current_name:
-                    # End of name sequence
-                    full_name = ' '.join(current_name).strip()
-                    if len(full_name) > 2:  # Filter out very short names
-                        names.append({
-                            'name': full_name,
-                            'confidence': 0.8,
-                            'method': 'layoutlm',
-                            'bbox': ocr_results[i-1]['bbox'] if i > 0 and i-1 < len(ocr_results) else None
-                        })
-                    current_name = []
+            word_count = min(len(words), len(predictions))
+            starts, ends = _label_runs(predictions[:word_count], [1])
             
-            # Handle case where name is at the end
-            if current_name:
-                full_name = ' '.join(current_name).strip()
-                if len(full_name) > 2:
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                full_name = ' '.join(words[start:end]).strip()
+                if len(full_name) > 2:  # Filter out very short names
                     names.append({
                         'name': full_name,
                         'confidence': 0.8,
                         'method': 'layoutlm',
-                        'bbox': ocr_results[-1]['bbox'] if ocr_results else None
+                        # Box of the name's last word
+                        'bbox': ocr_results[end - 1]['bbox'] if end - 1 < len(ocr_results) else None
                     })
             
             return names
@@ -400,167 +1109,136 @@ class EnhancedNameDetector:
             self.logger.error(f"Error in LayoutLM name detection: {e}")
             return []
     
-    def _detect_names_bert_ner(self, image_path: str) -> List[Dict]:
-        """Detect names using BERT NER model"""
-        try:
-            # Extract text from image (handle PDFs)
-            if image_path.lower().endswith('.pdf'):
-                import pdf2image
-                images = pdf2image.convert_from_path(image_path, dpi=300)
-                if not images:
-                    return []
-                image = images[0]
+    def _detect_names_bert_ner(self, text: str) -> List[Dict]:
+        """Detect names using BERT NER model on the page's OCR text"""
+        return self._detect_names_bert_ner_batch([text])[0]
+    
+    def _detect_names_bert_ner_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """
+        Detect names using BERT NER model on several pages' OCR text, ner_batch_size pages per
+        padded forward pass. Returns one list of names per text.
+        """
+        all_names = [[] for _ in texts]
+        pending = []
+        for i, text in enumerate(texts):
+            if text.strip():
+                pending.append(i)
             else:
-                image = Image.open(image_path)
-            
-            text = pytesseract.image_to_string(image)
-            if not text.strip():
                 self.logger.warning("No text extracted from image for BERT NER")
-                return []
-            
-            # Tokenize text
-            tokens = self.bert_ner_tokenizer(
-                text,
-                return_tensors="pt",
-                truncation=True,
-                max_length=512
-            )
-            
-            # Move to device
-            input_ids = tokens["input_ids"].to(self.device)
-            attention_mask = tokens["attention_mask"].to(self.device)
-            
-            # Get predictions
-            with torch.no_grad():
-                outputs = self.bert_ner_model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask
+        
+        for start in range(0, len(pending), self.ner_batch_size):
+            batch = pending[start:start + self.ner_batch_size]
+            try:
+                # Tokenize text, padding to the longest page in the batch
+                tokens = self.bert_ner_tokenizer(
+                    [' '.join(texts[i].split(maxsplit=MODEL_MAX_WORDS)[:MODEL_MAX_WORDS]) for i in batch],
+                    return_tensors="pt",
+                    truncation=True,
+                    padding='max_length' if self._bert_ner_static_shapes() else True,
+                    max_length=512
                 )
-            
-            # Process predictions
-            predictions = outputs.logits.argmax(-1).squeeze().cpu().numpy()
-            tokens_list = self.bert_ner_tokenizer.convert_ids_to_tokens(input_ids[0])
-            
-            # Define label mapping for CONLL-03 format
-            # 0: O (Outside), 1: B-PER (Beginning of Person), 2: I-PER (Inside of Person)
-            # 3: B-ORG, 4: I-ORG, 5: B-LOC, 6: I-LOC, 7: B-MISC, 8: I-MISC
-            PERSON_LABELS = [1, 2]  # B-PER and I-PER
-            
-            # Extract names (PERSON entities)
-            names = []
-            current_name = []
-            
-            for i, (token, pred) in enumerate(zip(tokens_list, predictions)):
-                if pred in PERSON_LABELS:  # PERSON label (B-PER or I-PER)
-                    # Clean up token (remove ## for subword tokens)
-                    clean_token = token.replace('##', '')
-                    if clean_token:  # Only add non-empty tokens
-                        current_name.append(clean_token)
-                elif current_name:
-                    # End of name sequence
-                    full_name = ' '.join(current_name).strip()
-                    if len(full_name) > 2:  # Filter out very short names
-                        names.append({
-                            'name': full_name,
-                            'confidence': 0.85,
-                            'method': 'bert_ner',
-                            'bbox': None
-                        })
-                    current_name = []
-            
-            # Handle case where name is at the end
-            if current_name:
-                full_name = ' '.join(current_name).strip()
-                if len(full_name) > 2:
-                    names.append({
-                        'name': full_name,
-                        'confidence': 0.85,
-                        'method': 'bert_ner',
-                        'bbox': None
-                    })
-            
-            # Debug logging
-            if not names:
-                self.logger.debug(f"BERT NER: No names detected in text: '{text[:100]}...'")
-                self.logger.debug(f"BERT NER: Predictions sample: {predictions[:10]}")
-                self.logger.debug(f"BERT NER: Tokens sample: {tokens_list[:10]}")
-            
-            return names
-            
-        except Exception as e:
-            self.logger.error(f"Error in BERT NER name detection: {e}")
-            return []
+                
+                # Move to device
+                input_ids = self._to_device(tokens["input_ids"], self.bert_ner_session)
+                attention_mask = self._to_device(tokens["attention_mask"], self.bert_ner_session)
+                
+                # Get predictions
+                predictions = self._token_predictions(self.bert_ner_model, self.bert_ner_session, {
+                    'input_ids': input_ids,
+                    'attention_mask': attention_mask
+                }, squeeze=False)
+                
+                # Padding is on the right, so each page's real tokens are a prefix of its row
+                lengths = attention_mask.sum(dim=1).tolist()
+                for row, i in enumerate(batch):
+                    token_ids = input_ids[row][:lengths[row]].tolist()
+                    all_names[i] = self._bert_ner_names(token_ids, predictions[row][:lengths[row]], texts[i])
+                
+            except Exception as e:
+                self.logger.error(f"Error in BERT NER name detection: {e}")
+        
+        return all_names
+    
+    def _runs_compiled_graphs(self) -> bool:
+        """
+        Whether either model runs as a compiled reduce-overhead graph. CUDA-graph trees are
+        thread-local and replays reuse their output buffers, so these must not run from the
+        method pool alongside the caller's thread.
+        """
+        return self._layoutlm_static_shapes() or self._bert_ner_static_shapes()
+    
+    def _layoutlm_static_shapes(self) -> bool:
+        """Whether LayoutLM runs as a compiled PyTorch graph, which wants fixed-length input"""
+        return self.compile_models and self.layoutlm_session is None
+    
+    def _bert_ner_static_shapes(self) -> bool:
+        """Whether BERT NER runs as a compiled PyTorch graph, which wants fixed-length input"""
+        return self.compile_models and self.bert_ner_session is None
+    
+    def _bert_ner_names(self, token_ids: List[int], predictions: np.ndarray, text: str) -> List[Dict]:
+        """
+        Group consecutive PERSON-labelled tokens of one sequence into names. Only the ids inside
+        each run are converted back to token strings, not the whole page.
+        """
+        # Define label mapping for CONLL-03 format
+        # 0: O (Outside), 1: B-PER (Beginning of Person), 2: I-PER (Inside of Person)
+        # 3: B-ORG, 4: I-ORG, 5: B-LOC, 6: I-LOC, 7: B-MISC, 8: I-MISC
+        PERSON_LABELS = [1, 2]  # B-PER and I-PER
+        
+        # Extract names (PERSON entities)
+        names = []
+        token_count = min(len(token_ids), len(predictions))
+        starts, ends = _label_runs(predictions[:token_count], PERSON_LABELS)
+        
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            # Glue subword tokens (##xx) back onto the token before them
+            tokens = self.bert_ner_tokenizer.convert_ids_to_tokens(token_ids[start:end])
+            full_name = ' '.join(tokens).replace(' ##', '').replace('##', '').strip()
+            if len(full_name) > 2:  # Filter out very short names
+                names.append({
+                    'name': full_name,
+                    'confidence': 0.85,
+                    'method': 'bert_ner',
+                    'bbox': None
+                })
+        
+        # Debug logging
+        if not names and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f"BERT NER: No names detected in text: '{text[:100]}...'")
+            self.logger.debug(f"BERT NER: Predictions sample: {predictions[:10]}")
+            self.logger.debug(f"BERT NER: Tokens sample: {self.bert_ner_tokenizer.convert_ids_to_tokens(token_ids[:10])}")
+        
+        return names
     
-    def _detect_names_patterns(self, image_path: str, doc_type: str) -> List[Dict]:
+    def _detect_names_patterns(self, text: str, doc_type: str) -> List[Dict]:
         """ENHANCED: Detect names using pattern matching for tax documents with better filtering"""
         try:
-            # Extract text from image (handle PDFs)
-            if image_path.lower().endswith('.pdf'):
-                import pdf2image
-                images = pdf2image.convert_from_path(image_path, dpi=300)
-                if not images:
-                    return []
-                image = images[0]
-            else:
-                image = Image.open(image_path)
-            
-            text = pytesseract.image_to_string(image)
             if not text.strip():
                 return []
             
             names = []
             entity_types = []
             
-            # ENHANCED: More specific patterns for actual person names
-            person_name_patterns = [
-                # Individual names with proper capitalization
-                r'([A-Z][a-z]+ [A-Z][a-z]+)',
-                r'([A-Z][a-z]+ [A-Z][a-z]+ [A-Z][a-z]+)',  # First Middle Last
-                # Names with titles
-                r'(Mr\.|Mrs\.|Ms\.|Dr\.) ([A-Z][a-z]+ [A-Z][a-z]+)',
-                # Names in specific contexts
-                r'(Partner|Recipient|Employee|Taxpayer|Borrower): ([A-Z][a-z]+ [A-Z][a-z]+)',
-                r'([A-Z][a-z]+ [A-Z][a-z]+) (Partner|Recipient|Employee|Taxpayer|Borrower)',
-                # Trust beneficiary patterns
-                r'([A-Z][a-z]+ [A-Z][a-z]+) Trust',
-                r'Trust of ([A-Z][a-z]+ [A-Z][a-z]+)',
-                # Partnership patterns
-                r'([A-Z][a-z]+ [A-Z][a-z]+) & ([A-Z][a-z]+ [A-Z][a-z]+)',
-                r'([A-Z][a-z]+ [A-Z][a-z]+) AND ([A-Z][a-z]+ [A-Z][a-z]+)',
-            ]
-            
-            # ENHANCED: Filter out common non-name terms
-            exclude_terms = {
-                'federal', 'state', 'total', 'units', 'value', 'amount', 'tax', 'trust', 'assets',
-                'liquid', 'estate', 'other', 'held', 'goodman', 'llc', 'applicable', 'discounts',
-                'net', 'taxable', 'related', 'generation', 'skipping', 'payable', 'available',
-                'estimated', 'capital', 'gains', 'monetization', 'beneficiaries', 'transfer',
-                'basis', 'personal', 'article', 'exempt', 'nia', 'uw', 'appt', 'farber'
-            }
+            # Entity type only depends on the pattern and the page text, so work it out once per pattern
+            pattern_entity_types = {}
             
-            for pattern in person_name_patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                for match in matches:
-                    if len(match.groups()) == 1:
-                        name = match.group(1).strip()
-                    else:
-                        # For patterns with multiple groups (like partnerships)
-                        name_parts = [match.group(i).strip() for i in range(1, len(match.groups()) + 1)]
-                        name = ' '.join(name_parts)
-                    
-                    # ENHANCED: Filter out non-name terms
-                    if self._is_valid_person_name(name, exclude_terms):
+            for pattern, name in self._pattern_name_candidates(text):
+                # ENHANCED: Filter out non-name terms
+                if self._is_valid_person_name(name, NAME_EXCLUDE_TERMS):
+                    entity_type = pattern_entity_types.get(pattern)
+                    if entity_type is None:
                         entity_type = self._detect_entity_type_from_pattern(pattern, name, text)
-                        names.append({
-                            'name': name,
-                            'confidence': 0.8,  # Higher confidence for filtered names
-                            'method': 'patterns',
-                            'entity_type': entity_type,
-                            'bbox': None
-                        })
-                        
-                        if entity_type and entity_type not in entity_types:
-                            entity_types.append(entity_type)
+                        pattern_entity_types[pattern] = entity_type
+                    names.append({
+                        'name': name,
+                        'confidence': 0.8,  # Higher confidence for filtered names
+                        'method': 'patterns',
+                        'entity_type': entity_type,
+                        'bbox': None
+                    })
+                    
+                    if entity_type and entity_type not in entity_types:
+                        entity_types.append(entity_type)
             
             # Add entity type information to results
             if entity_types:
@@ -572,47 +1250,41 @@ class EnhancedNameDetector:
             self.logger.error(f"Error in pattern-based name detection: {e}")
             return []
     
-    def _is_valid_person_name(self, name: str, exclude_terms: set) -> bool:
-        """ENHANCED: Validate if a detected name is actually a person name"""
-        if not name or len(name.strip()) < 3:
-            return False
-        
-        name_lower = name.lower()
-        name_parts = name.split()
-        
-        # Must have at least first and last name
-        if len(name_parts) < 2:
-            return False
-        
-        # Check if any part is in exclude terms
-        for part in name_parts:
-            if part.lower() in exclude_terms:
-                return False
-        
-        # Check for proper capitalization (first letter of each part should be uppercase)
-        for part in name_parts:
-            if not part or not part[0].isupper():
-                return False
-        
-        # Check for reasonable name length (not too long)
-        if len(name) > 50:
-            return False
+    def _pattern_name_candidates(self, text: str):
+        """
+        Yield (source pattern, name) for every person name pattern match in text: one pass of the
+        fused contextual patterns whose trigger words occur in the page, then one pass per bare
+        name pattern. Patterns with several names (partnerships) yield each name separately.
+        """
+        active = self._active_person_name_patterns(text)
+        if active:
+            person_name_re, person_name_groups = self._fused_person_name_re(active)
+            for match in person_name_re.finditer(text):
+                pattern, groups = person_name_groups[match.lastgroup]
+                for i in groups:
+                    yield pattern, match.group(i).strip()
         
-        # Check for common name patterns
-        # Should not be all uppercase (likely a header)
-        if name.isupper():
+        for pattern, regex in self._bare_person_name_res:
+            for match in regex.finditer(text):
+                for name in match.groups():
+                    yield pattern, name.strip()
+    
+    def _is_valid_person_name(self, name: str, exclude_terms: frozenset) -> bool:
+        """ENHANCED: Validate if a detected name is actually a person name"""
+        if not name:
             return False
+        name = name.strip()
         
-        # Should not contain numbers (likely not a person name)
-        if any(char.isdigit() for char in name):
+        # Not too long, not all uppercase (likely a header), and at least first and last name,
+        # each capitalised, no digits - cheapest check first
+        if len(name) > 50 or name.isupper() or not _has_name_shape(name):
             return False
         
-        # Should not be common financial terms
-        financial_terms = {'total', 'value', 'amount', 'units', 'federal', 'state', 'tax'}
-        if any(term in name_lower for term in financial_terms):
+        # Should not be common financial terms, or contain an excluded word
+        name_lower = name.lower()
+        if FINANCIAL_TERMS_RE.search(name_lower):
             return False
-        
-        return True
+        return exclude_terms.isdisjoint(name_lower.split())
     
     def _detect_entity_type_from_pattern(self, pattern: str, name: str, text: str) -> str:
         """Detect entity type based on the pattern and context"""
@@ -647,57 +1319,164 @@ class EnhancedNameDetector:
         # Default to individual
         return 'Individual'
     
+    def _extract_ocr_once(self, image_path: str) -> Tuple[Optional[Tuple[int, int]], List[Dict], str]:
+        """
+        Load the first page and run tesseract once (see _ocr_page), returning
+        (image size, OCR words with boxes, full page text). Returns (None, [], '') if the page
+        cannot be loaded or OCR fails. The last OCR_MEMO_SIZE pages are remembered by path,
+        mtime and size, so detection and learning on the same page share one tesseract pass;
+        behind that, OCR output is kept on disk by page content (see _get_cached_ocr).
+        """
+        try:
+            memo_key, cache_key, page = self._lookup_ocr(image_path)
+        except OSError as e:
+            self.logger.error(f"Could not OCR {image_path} for name detection: {e}")
+            return None, [], ''
+        
+        if page is None:
+            try:
+                ocr_page = _ocr_page(image_path)
+            except Exception as e:
+                self.logger.error(f"Could not OCR {image_path} for name detection: {e}")
+                return None, [], ''
+            if ocr_page is None:
+                return None, [], ''
+            page = self._remember_ocr(memo_key, cache_key, ocr_page)
+        
+        return page
+    
+    def _lookup_ocr(self, image_path: str) -> Tuple[Tuple, Optional[str], Optional[Tuple[Tuple[int, int], List[Dict], str]]]:
+        """
+        (memo key, content key, page) for image_path, where page is the cached
+        (image size, OCR words with boxes, page text) from the memo or disk, or None if it has to be
+        OCRed. The content key is only computed when the memo misses. Raises OSError if unreadable.
+        """
+        stat = os.stat(image_path)
+        memo_key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        
+        with self._ocr_memo_lock:
+            page = self._ocr_memo.get(memo_key)
+            if page is not None:
+                self._ocr_memo.move_to_end(memo_key)
+                image_size, ocr_results, text = page
+                return memo_key, None, (image_size, copy.deepcopy(ocr_results), text)
+        
+        cache_key = self._ocr_cache_key(image_path)
+        page = self._get_cached_ocr(cache_key)
+        if page is not None:
+            self._memo_ocr(memo_key, page)
+        return memo_key, cache_key, page
+    
+    def _remember_ocr(self, memo_key: Tuple, cache_key: str,
+                      ocr_page: Tuple[Tuple[int, int], Dict]) -> Tuple[Tuple[int, int], List[Dict], str]:
+        """Turn _ocr_page output into (image size, OCR words, page text) and cache it on disk and in the memo"""
+        image_size, ocr_data = ocr_page
+        page = (image_size, self._ocr_results_from_data(ocr_data), self._ocr_text_from_data(ocr_data))
+        self._store_cached_ocr(cache_key, page)
+        self._memo_ocr(memo_key, page)
+        return page
+    
+    def _memo_ocr(self, memo_key: Tuple, page: Tuple[Tuple[int, int], List[Dict], str]):
+        """Add a copy of page to the OCR memo, evicting the least recently used page when full"""
+        image_size, ocr_results, text = page
+        with self._ocr_memo_lock:
+            self._ocr_memo[memo_key] = (image_size, copy.deepcopy(ocr_results), text)
+            if len(self._ocr_memo) > OCR_MEMO_SIZE:
+                self._ocr_memo.popitem(last=False)
+    
+    def _ocr_cache_key(self, image_path: str) -> str:
+        """Hex key from the page bytes and OCR_CACHE_VERSION"""
+        key = hashlib.blake2b(f"{OCR_CACHE_VERSION}|".encode(), digest_size=16)
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                key.update(chunk)
+        return key.hexdigest()
+    
+    def _get_cached_ocr(self, cache_key: str) -> Optional[Tuple[Tuple[int, int], List[Dict], str]]:
+        """(image size, OCR words with boxes, page text) stored on disk for cache_key, or None"""
+        if OCR_CACHE_DIR is None:
+            return None
+        try:
+            with open(os.path.join(OCR_CACHE_DIR, f"{cache_key}.json"), 'rb') as f:
+                cached = _json_loads(f.read())
+            return tuple(cached['image_size']), cached['ocr_results'], cached['text']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _store_cached_ocr(self, cache_key: str, page: Tuple[Tuple[int, int], List[Dict], str]):
+        """Store one page's OCR output on disk (best-effort, failures are only logged)"""
+        if OCR_CACHE_DIR is None:
+            return
+        image_size, ocr_results, text = page
+        cache_file = os.path.join(OCR_CACHE_DIR, f"{cache_key}.json")
+        try:
+            write_cache_file(cache_file, json.dumps(
+                {'image_size': list(image_size), 'ocr_results': ocr_results, 'text': text}))
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.debug(f"Could not write OCR cache file {cache_file}: {e}")
+    
+    def _ocr_text_from_data(self, ocr_data: Dict) -> str:
+        """Rebuild the page text from image_to_data output: words joined by spaces, one line per OCR line"""
+        lines = {}
+        for i, word in enumerate(ocr_data['text']):
+            word = word.strip()
+            if word:
+                line_key = (ocr_data['block_num'][i], ocr_data['par_num'][i], ocr_data['line_num'][i])
+                lines.setdefault(line_key, []).append(word)
+        return '\n'.join(' '.join(words) for words in lines.values())
+    
     def _run_ocr_with_boxes(self, image: Image.Image) -> List[Dict]:
         """Run OCR and return text with bounding boxes"""
         try:
             # Use pytesseract to get OCR data with bounding boxes
             ocr_data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+            return self._ocr_results_from_data(ocr_data)
             
-            results = []
-            for i in range(len(ocr_data['text'])):
-                text = ocr_data['text'][i].strip()
-                if text and int(ocr_data['conf'][i]) > 30:  # Confidence threshold
-                    results.append({
-                        'text': text,
-                        'bbox': [
-                            ocr_data['left'][i],
-                            ocr_data['top'][i],
-                            ocr_data['left'][i] + ocr_data['width'][i],
-                            ocr_data['top'][i] + ocr_data['height'][i]
-                        ],
-                        'confidence': int(ocr_data['conf'][i]) / 100.0
-                    })
-            
-            return results
+        except Exception as e:
+            self.logger.error(f"Error in OCR with boxes: {e}")
+            return []
+    
+    def _ocr_results_from_data(self, ocr_data: Dict) -> List[Dict]:
+        """Words above the confidence threshold, with pixel bounding boxes, from image_to_data output"""
+        try:
+            # Column-wise: one confidence/emptiness mask, then boolean indexing for every field
+            texts = np.char.strip(np.asarray(ocr_data['text'], dtype=str))
+            conf = np.asarray(ocr_data['conf'], dtype=np.float64).astype(np.int32)
+            keep = (conf > 30) & (np.char.str_len(texts) > 0)  # Confidence threshold
+            
+            left = np.asarray(ocr_data['left'], dtype=np.int32)[keep]
+            top = np.asarray(ocr_data['top'], dtype=np.int32)[keep]
+            right = left + np.asarray(ocr_data['width'], dtype=np.int32)[keep]
+            bottom = top + np.asarray(ocr_data['height'], dtype=np.int32)[keep]
+            bboxes = np.stack([left, top, right, bottom], axis=1).tolist()
+            
+            return [
+                {'text': text, 'bbox': bbox, 'confidence': confidence}
+                for text, bbox, confidence in zip(texts[keep].tolist(), bboxes, (conf[keep] / 100.0).tolist())
+            ]
             
         except Exception as e:
             self.logger.error(f"Error in OCR with boxes: {e}")
             return []
     
-    def _combine_name_results(self, results: Dict) -> List[Dict]:
-        """Combine and deduplicate name results from different methods"""
-        all_names = []
-        
-        # Collect all names
-        for method_names in [results['layoutlm_names'], results['bert_ner_names'], results['pattern_names'], results['location_names']]:
-            all_names.extend(method_names)
-        
-        # Deduplicate and rank
+    def _combine_name_results(self, results: Dict, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Combine and deduplicate name results from different methods in one pass, highest
+        confidence first. With limit, only the best limit names are ranked and returned.
+        """
+        # Deduplicate, keeping the highest confidence detection of each name
         unique_names = {}
-        for name_info in all_names:
-            name = name_info['name'].lower().strip()
-            if name not in unique_names:
+        for name_info in chain(results['layoutlm_names'], results['bert_ner_names'],
+                               results['pattern_names'], results['location_names']):
+            name = _name_key(name_info['name'])
+            previous = unique_names.get(name)
+            if previous is None or name_info['confidence'] > previous['confidence']:
                 unique_names[name] = name_info
-            else:
-                # If we have multiple detections, use the highest confidence
-                if name_info['confidence'] > unique_names[name]['confidence']:
-                    unique_names[name] = name_info
         
-        # Sort by confidence
-        combined = list(unique_names.values())
-        combined.sort(key=lambda x: x['confidence'], reverse=True)
-        
-        return combined
+        # Rank by confidence
+        if limit is not None:
+            return heapq.nlargest(limit, unique_names.values(), key=itemgetter('confidence'))
+        return sorted(unique_names.values(), key=itemgetter('confidence'), reverse=True)
     
     def _calculate_confidence(self, results: Dict) -> float:
         """Calculate overall confidence based on detection methods and results"""
@@ -741,40 +1520,25 @@ class EnhancedNameDetector:
             self.logger.warning("No valid person names found after filtering")
             return None
         
-        # Enhanced selection logic for person names
-        best_name = None
-        best_score = 0.0
+        # Enhanced selection logic for person names: score every candidate in one array expression
+        count = len(person_names)
+        confidence = np.fromiter((n['confidence'] for n in person_names), dtype=np.float64, count=count)
+        # First two parts of each name ('' when missing), so both features are plain C-level string checks
+        first_parts = [(n['name'].split(None, 2) + ['', ''])[:2] for n in person_names]
+        # Full names (first + last), and full names with proper capitalization
+        full_name = np.fromiter((bool(second) for _, second in first_parts), dtype=bool, count=count)
+        capitalized = np.fromiter((first[:1].isupper() and second[:1].isupper() for first, second in first_parts),
+                                  dtype=bool, count=count)
+        # Names detected by multiple methods
+        multi_method = np.fromiter((len(n.get('detection_methods', [])) > 1 for n in person_names),
+                                   dtype=bool, count=count)
         
-        for name_info in person_names:
-            name = name_info['name'].strip()
-            confidence = name_info['confidence']
-            
-            # Calculate a score based on multiple factors
-            score = confidence
-            
-            # Boost score for names that look like real person names
-            name_parts = name.split()
-            if len(name_parts) >= 2:
-                # Boost for full names (first + last)
-                score += 0.2
-                
-                # Boost for names with proper capitalization
-                if name_parts[0][0].isupper() and name_parts[1][0].isupper():
-                    score += 0.1
-            
-            # Boost for names detected by multiple methods
-            detection_methods = name_info.get('detection_methods', [])
-            if len(detection_methods) > 1:
-                score += 0.15
-            
-            # Boost for names with higher confidence
-            if confidence > 0.8:
-                score += 0.1
-            
-            # Update best name if this one has a higher score
-            if score > best_score:
-                best_score = score
-                best_name = name
+        score = confidence + 0.2 * full_name + 0.1 * capitalized + 0.15 * multi_method + 0.1 * (confidence > 0.8)
+        
+        # First candidate with the highest score
+        best = int(np.argmax(score))
+        best_score = float(score[best])
+        best_name = person_names[best]['name'].strip() if best_score > 0.0 else None
         
         if best_name:
             self.logger.info(f"Selected primary name: {best_name} (score: {best_score:.2f})")
@@ -785,47 +1549,17 @@ class EnhancedNameDetector:
     
     def _is_likely_person_name(self, name: str) -> bool:
         """ENHANCED: Check if a name is likely to be a real person name"""
-        if not name or len(name.strip()) < 3:
+        if not name or len(name) > 50:
             return False
+        name = name.strip()
         
-        name_parts = name.split()
-        
-        # Must have at least first and last name
-        if len(name_parts) < 2:
-            return False
-        
-        # Check for proper capitalization
-        for part in name_parts:
-            if not part or not part[0].isupper():
-                return False
-        
-        # Check for reasonable name length
-        if len(name) > 50:
-            return False
-        
-        # Should not be all uppercase (likely a header)
-        if name.isupper():
+        # Not all uppercase, then at least first and last name, each capitalised, no digits -
+        # cheapest check first, so headers never reach the shape check
+        if name.isupper() or not _has_name_shape(name):
             return False
         
-        # Should not contain numbers
-        if any(char.isdigit() for char in name):
-            return False
-        
-        # Should not be common financial/legal terms
-        exclude_terms = {
-            'federal', 'state', 'total', 'units', 'value', 'amount', 'tax', 'trust', 'assets',
-            'liquid', 'estate', 'other', 'held', 'goodman', 'llc', 'applicable', 'discounts',
-            'net', 'taxable', 'related', 'generation', 'skipping', 'payable', 'available',
-            'estimated', 'capital', 'gains', 'monetization', 'beneficiaries', 'transfer',
-            'basis', 'personal', 'article', 'exempt', 'nia', 'uw', 'appt', 'farber'
-        }
-        
-        name_lower = name.lower()
-        for term in exclude_terms:
-            if term in name_lower:
-                return False
-        
-        return True
+        # Should not contain common financial/legal terms
+        return not _contains_exclude_term(name)
     
     def get_all_detected_names(self, results: Dict) -> List[str]:
         """Get all detected names as a list"""
@@ -845,58 +1579,62 @@ class EnhancedNameDetector:
         """
         try:
             # Extract OCR results for learning
-            image = Image.open(image_path).convert("RGB")
-            ocr_results = self._run_ocr_with_boxes(image)
-            
-            # Create learning entry
+            # Usually served from the OCR memo, since the page was just run through detection
+            image_size, _, _ = self._extract_ocr_once(image_path)
+            if image_size is None:
+                return
+            
+            # Create learning entry. The page's OCR words are not copied into it, only image_hash
+            # (the OCR cache key, see _get_cached_ocr), so the learning file stays small
+            # One timestamp for every record this input creates
+            timestamp = datetime.now().isoformat()
             learning_entry = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': timestamp,
                 'image_path': image_path,
+                'image_hash': self._ocr_cache_key(image_path),
                 'manual_name': manual_name,
                 'doc_type': doc_type or 'Unknown',
                 'bbox_location': bbox_location,
                 'confidence': confidence,
-                'ocr_results': ocr_results,
-                'image_size': image.size
+                'image_size': image_size
             }
             
-            # Add to learning data
-            self.learning_data['manual_inputs'].append(learning_entry)
-            
-            # Update form type patterns
-            if doc_type:
-                if doc_type not in self.learning_data['form_types']:
-                    self.learning_data['form_types'][doc_type] = []
-                self.learning_data['form_types'][doc_type].append({
-                    'name': manual_name,
-                    'bbox': bbox_location,
-                    'timestamp': datetime.now().isoformat()
-                })
-            
-            # Update location patterns
-            if bbox_location and doc_type:
-                self._update_location_patterns(doc_type, manual_name, bbox_location, image.size)
+            with self._learning_lock:
+                # Add to learning data, keeping the most recent MAX_MANUAL_INPUTS
+                manual_inputs = self.learning_data['manual_inputs']
+                manual_inputs.append(learning_entry)
+                del manual_inputs[:-MAX_MANUAL_INPUTS]
+                
+                # Update form type patterns
+                if doc_type:
+                    if doc_type not in self.learning_data['form_types']:
+                        self.learning_data['form_types'][doc_type] = []
+                    self.learning_data['form_types'][doc_type].append({
+                        'name': manual_name,
+                        'bbox': bbox_location,
+                        'timestamp': timestamp
+                    })
+                
+                # Update location patterns
+                if bbox_location and doc_type:
+                    self._update_location_patterns(doc_type, manual_name, bbox_location, image_size, timestamp)
             
-            # Save learning data
-            self._save_learning_data()
-            self._save_location_patterns()
+            # Save learning data (coalesced with any other inputs in the next few seconds)
+            self._schedule_learning_save()
             
             self.logger.info(f"Learned from manual input: {manual_name} on {doc_type or 'Unknown'} form")
             
         except Exception as e:
             self.logger.error(f"Error learning from manual input: {e}")
     
-    def _update_location_patterns(self, doc_type: str, name: str, bbox: List[int], image_size: Tuple[int, int]):
-        """Update location-based patterns for specific form types"""
+    def _update_location_patterns(self, doc_type: str, name: str, bbox: List[int], image_size: Tuple[int, int],
+                                  timestamp: Optional[str] = None):
+        """Update location-based patterns for specific form types (timestamp defaults to now)"""
         try:
             # Normalize bbox coordinates
             width, height = image_size
-            normalized_bbox = [
-                bbox[0] / width,
-                bbox[1] / height,
-                bbox[2] / width,
-                bbox[3] / height
-            ]
+            x1, y1, x2, y2 = bbox
+            normalized_bbox = [x1 / width, y1 / height, x2 / width, y2 / height]
             
             if doc_type not in self.location_patterns['form_types']:
                 self.location_patterns['form_types'][doc_type] = {
@@ -908,89 +1646,95 @@ class EnhancedNameDetector:
             self.location_patterns['form_types'][doc_type]['name_locations'].append({
                 'name': name,
                 'bbox': normalized_bbox,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': timestamp or datetime.now().isoformat()
             })
             
             # Keep only recent patterns (last 50)
             if len(self.location_patterns['form_types'][doc_type]['name_locations']) > 50:
                 self.location_patterns['form_types'][doc_type]['name_locations'] = \
                     self.location_patterns['form_types'][doc_type]['name_locations'][-50:]
+            
+            # Rebuilt from the updated list on next use
+            self._pattern_arrays.pop(doc_type, None)
                     
         except Exception as e:
             self.logger.error(f"Error updating location patterns: {e}")
     
-    def _detect_names_by_location(self, image_path: str, doc_type: str) -> List[Dict]:
-        """Detect names based on learned location patterns"""
+    def _location_pattern_arrays(self, doc_type: str) -> Tuple[np.ndarray, List[str]]:
+        """
+        doc_type's learned name locations as a (K, 4) array of normalized boxes plus the parallel
+        list of names, built from location_patterns on first use and after each update
+        """
+        arrays = self._pattern_arrays.get(doc_type)
+        if arrays is None:
+            patterns = self.location_patterns['form_types'].get(doc_type, {}).get('name_locations', [])
+            boxes = np.array([pattern['bbox'] for pattern in patterns], dtype=np.float64).reshape(-1, 4)
+            arrays = self._pattern_arrays[doc_type] = (boxes, [pattern['name'] for pattern in patterns])
+        return arrays
+    
+    def _detect_names_by_location(self, image_size: Tuple[int, int], ocr_results: List[Dict],
+                                  doc_type: str) -> List[Dict]:
+        """Detect names based on learned location patterns, given the page size and its OCR words"""
         try:
             if doc_type not in self.location_patterns['form_types']:
                 return []
             
-            image = Image.open(image_path).convert("RGB")
-            width, height = image.size
-            ocr_results = self._run_ocr_with_boxes(image)
+            pattern_boxes, pattern_names = self._location_pattern_arrays(doc_type)
+            boxed = [ocr_item for ocr_item in ocr_results if ocr_item.get('bbox')]
+            if not pattern_names or not boxed:
+                return []
             
+            # Convert normalized coordinates back to pixel coordinates, all patterns at once
+            width, height = image_size
+            scale = np.array([width, height, width, height], dtype=np.float64)
+            target_boxes = (pattern_boxes * scale).astype(np.int64)
+            ocr_boxes = np.array([ocr_item['bbox'] for ocr_item in boxed], dtype=np.int64)
+            
+            # Index the words by top edge: a word can only overlap a target if its top lies in
+            # (target top - tallest word, target bottom), so each target is checked against that band only
+            order = np.argsort(ocr_boxes[:, 1], kind='stable')
+            tops = ocr_boxes[order, 1]
+            max_height = max(int((ocr_boxes[:, 3] - ocr_boxes[:, 1]).max()), 0)
+            band_starts = np.searchsorted(tops, target_boxes[:, 1] - max_height, side='right').tolist()
+            band_ends = np.searchsorted(tops, target_boxes[:, 3], side='left').tolist()
+            
+            # Find OCR results that overlap with each target location, grouped by pattern and in
+            # OCR order within each
             detected_names = []
-            patterns = self.location_patterns['form_types'][doc_type]['name_locations']
-            
-            for pattern in patterns:
-                pattern_bbox = pattern['bbox']
-                # Convert normalized coordinates back to pixel coordinates
-                target_bbox = [
-                    int(pattern_bbox[0] * width),
-                    int(pattern_bbox[1] * height),
-                    int(pattern_bbox[2] * width),
-                    int(pattern_bbox[3] * height)
-                ]
-                
-                # Find OCR results that overlap with the target location
-                for ocr_item in ocr_results:
-                    if 'bbox' in ocr_item and ocr_item['bbox']:
-                        ocr_bbox = ocr_item['bbox']
-                        if self._bboxes_overlap(ocr_bbox, target_bbox, threshold=0.3):
-                            detected_names.append({
-                                'name': ocr_item['text'],
-                                'confidence': 0.8,
-                                'method': 'location_pattern',
-                                'bbox': ocr_item['bbox'],
-                                'learned_from': pattern['name']
-                            })
+            for p, (band_start, band_end) in enumerate(zip(band_starts, band_ends)):
+                band = order[band_start:band_end]
+                if not band.size:
+                    continue
+                hits = band[_target_overlaps(target_boxes[p], ocr_boxes[band], 0.3)]
+                for o in np.sort(hits).tolist():
+                    ocr_item = boxed[o]
+                    detected_names.append({
+                        'name': ocr_item['text'],
+                        'confidence': 0.8,
+                        'method': 'location_pattern',
+                        'bbox': ocr_item['bbox'],
+                        'learned_from': pattern_names[p]
+                    })
             
             return detected_names
             
         except Exception as e:
             self.logger.error(f"Error in location-based detection: {e}")
             return []
-    
-    def _bboxes_overlap(self, bbox1: List[int], bbox2: List[int], threshold: float = 0.3) -> bool:
-        """Check if two bounding boxes overlap significantly"""
-        try:
-            # Calculate intersection
-            x1 = max(bbox1[0], bbox2[0])
-            y1 = max(bbox1[1], bbox2[1])
-            x2 = min(bbox1[2], bbox2[2])
-            y2 = min(bbox1[3], bbox2[3])
-            
-            if x2 <= x1 or y2 <= y1:
-                return False
-            
-            intersection = (x2 - x1) * (y2 - y1)
-            area1 = (bbox1[2] - bbox1[0]) * (bbox1[3] - bbox1[1])
-            area2 = (bbox2[2] - bbox2[0]) * (bbox2[3] - bbox2[1])
-            
-            # Calculate overlap ratio
-            overlap_ratio = intersection / min(area1, area2)
-            return overlap_ratio >= threshold
-            
-        except Exception as e:
-            self.logger.error(f"Error calculating bbox overlap: {e}")
-            return False 
 
     def _load_learning_data(self) -> Dict:
         """Load learning data from file"""
         try:
             if os.path.exists(self.learning_data_file):
-                with open(self.learning_data_file, 'r') as f:
-                    return json.load(f)
+                # One read of the whole file, parsed from bytes
+                with open(self.learning_data_file, 'rb') as f:
+                    learning_data = _json_loads(f.read())
+                # Files written before inputs referenced the OCR cache embed each page's OCR words
+                manual_inputs = learning_data.get('manual_inputs', [])
+                del manual_inputs[:-MAX_MANUAL_INPUTS]
+                for entry in manual_inputs:
+                    entry.pop('ocr_results', None)
+                return learning_data
         except Exception as e:
             self.logger.warning(f"Could not load learning data: {e}")
         return {
@@ -1000,12 +1744,42 @@ class EnhancedNameDetector:
             'last_updated': None
         }
     
+    def _schedule_learning_save(self):
+        """
+        Mark the learning files dirty and write them LEARNING_SAVE_DELAY seconds from the first
+        unsaved change. The timer thread is not a daemon, so pending changes are still written
+        when the interpreter exits.
+        """
+        with self._learning_lock:
+            self._learning_dirty = True
+            if self._learning_save_timer is None:
+                self._learning_save_timer = threading.Timer(LEARNING_SAVE_DELAY, self.flush_learning_data)
+                self._learning_save_timer.start()
+    
+    def flush_learning_data(self):
+        """Write pending learning data and location patterns to disk now"""
+        with self._learning_lock:
+            if self._learning_save_timer is not None:
+                self._learning_save_timer.cancel()
+                self._learning_save_timer = None
+            if not self._learning_dirty:
+                return
+            self._learning_dirty = False
+            self._save_learning_data()
+            self._save_location_patterns()
+    
+    def _write_json_atomic(self, path: str, data):
+        """Serialise data compactly to a temp file and rename it over path, so readers never see a partial file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(_json_dumps(data))
+        os.replace(temp_file, path)
+    
     def _save_learning_data(self):
         """Save learning data to file"""
         try:
-            os.makedirs(os.path.dirname(self.learning_data_file), exist_ok=True)
-            with open(self.learning_data_file, 'w') as f:
-                json.dump(self.learning_data, f, indent=2)
+            self._write_json_atomic(self.learning_data_file, self.learning_data)
         except Exception as e:
             self.logger.error(f"Could not save learning data: {e}")
     
@@ -1013,8 +1787,8 @@ class EnhancedNameDetector:
         """Load location-based patterns from file"""
         try:
             if os.path.exists(self.location_patterns_file):
-                with open(self.location_patterns_file, 'r') as f:
-                    return json.load(f)
+                with open(self.location_patterns_file, 'rb') as f:
+                    return _json_loads(f.read())
         except Exception as e:
             self.logger.warning(f"Could not load location patterns: {e}")
         return {
@@ -1026,8 +1800,6 @@ class EnhancedNameDetector:
     def _save_location_patterns(self):
         """Save location patterns to file"""
         try:
-            os.makedirs(os.path.dirname(self.location_patterns_file), exist_ok=True)
-            with open(self.location_patterns_file, 'w') as f:
-                json.dump(self.location_patterns, f, indent=2)
+            self._write_json_atomic(self.location_patterns_file, self.location_patterns)
         except Exception as e:
             self.logger.error(f"Could not save location patterns: {e}") 
\ No newline at end of file
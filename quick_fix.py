@@ -14,6 +14,14 @@ from pathlib import Path
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Contents of a newly created .env file
+_ENV_TEMPLATE = (
+    b"# DIXII Configuration\n"
+    b"# Add your API keys here\n"
+    b"ANTHROPIC_API_KEY=your_api_key_here\n"
+    b"SECRET_KEY=your_secret_key_here\n"
+)
+
 def fix_permissions():
     """Fix file permissions"""
     logger.info("Fixing file permissions...")
@@ -94,21 +102,27 @@ def fix_config():
     try:
         from config import Config
         
-        # Create .env file if it doesn't exist
-        env_file = Path('.env')
-        if not env_file.exists():
+        # Create .env file if it doesn't exist: O_EXCL makes creation the existence check, and the
+        # template goes out in one unbuffered write, readable only by the owner (it holds API keys)
+        try:
+            fd = os.open('.env', os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            fd = None
+        if fd is not None:
             logger.info("Creating .env file...")
-            with open('.env', 'w') as f:
-                f.write("# DIXII Configuration\n")
-                f.write("# Add your API keys here\n")
-                f.write("ANTHROPIC_API_KEY=your_api_key_here\n")
-                f.write("SECRET_KEY=your_secret_key_here\n")
+            try:
+                os.write(fd, _ENV_TEMPLATE)
+            finally:
+                os.close(fd)
             logger.info("✓ Created .env file")
             logger.info("⚠ Please add your API keys to .env file")
         
-        # Ensure directories exist
+        # Ensure directories exist, creating only the ones a single directory listing did not show
+        with os.scandir('.') as entries:
+            existing = {entry.name for entry in entries if entry.is_dir()}
         for directory in ['uploads', 'processed']:
-            Path(directory).mkdir(exist_ok=True)
+            if directory not in existing:
+                Path(directory).mkdir(exist_ok=True)
             logger.info(f"✓ Ensured directory exists: {directory}")
         
         return True
@@ -10,6 +10,7 @@ import logging
 from config import Config
 from utils.enhanced_file_processor import EnhancedTaxDocumentProcessor
 from utils.intelligent_batch_processor import ProcessingPriority
+from utils.disk_cache import prune_disk_caches
 import json
 import traceback
 import zipfile
@@ -29,10 +30,16 @@ Config.init_app(app)
 # Global variables for processing
 processing_sessions = {}
 enhanced_processor = None
+# Cleared while init_enhanced_processor runs in the background at startup (see __main__)
+processor_ready = threading.Event()
+processor_ready.set()
 
 def cleanup_old_uploads(max_age_hours=24):
     """Clean up old files from uploads folder"""
     try:
+        # Cached pages, OCR text and extractions must not outlive the uploads they came from
+        prune_disk_caches(max_age_hours=max_age_hours)
+        
         upload_folder = Config.UPLOAD_FOLDER
         if not os.path.exists(upload_folder):
             return
@@ -108,22 +115,30 @@ def _update_batch_progress(session_id, current, filename):
 def init_enhanced_processor():
     """Initialize the enhanced document processor with batch processing"""
     global enhanced_processor
-    if not Config.ANTHROPIC_API_KEY or Config.ANTHROPIC_API_KEY.strip() == '':
-        print("Warning: ANTHROPIC_API_KEY not set. Document processing will be limited.")
-        enhanced_processor = None
-        return True
-    
     try:
-        enhanced_processor = EnhancedTaxDocumentProcessor(
-            donut_model_path=Config.DONUT_MODEL_PATH,
-            claude_api_key=Config.ANTHROPIC_API_KEY
-        )
-        print("Enhanced document processor with intelligent batch processing initialized successfully")
-        return True
-    except Exception as e:
-        print(f"Error initializing enhanced processor: {e}")
-        enhanced_processor = None
-        return True  # Allow app to start even if processor fails
+        if not Config.ANTHROPIC_API_KEY or Config.ANTHROPIC_API_KEY.strip() == '':
+            print("Warning: ANTHROPIC_API_KEY not set. Document processing will be limited.")
+            enhanced_processor = None
+            return True
+        
+        try:
+            enhanced_processor = EnhancedTaxDocumentProcessor(
+                donut_model_path=Config.DONUT_MODEL_PATH,
+                claude_api_key=Config.ANTHROPIC_API_KEY
+            )
+            print("Enhanced document processor with intelligent batch processing initialized successfully")
+            return True
+        except Exception as e:
+            print(f"Error initializing enhanced processor: {e}")
+            enhanced_processor = None
+            return True  # Allow app to start even if processor fails
+    finally:
+        processor_ready.set()
+
+def wait_for_processor():
+    """The enhanced processor, once startup initialization has finished (None if unavailable)"""
+    processor_ready.wait()
+    return enhanced_processor
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -134,7 +149,7 @@ def process_documents_enhanced_with_batching(session_id, file_paths, processing_
     """Enhanced background function with intelligent batch processing"""
     global processing_sessions, enhanced_processor
     
-    if not enhanced_processor:
+    if not wait_for_processor():
         processing_sessions[session_id]['status'] = 'error'
         processing_sessions[session_id]['error'] = 'Enhanced document processor not initialized'
         return
@@ -325,7 +340,7 @@ def upload_files_enhanced():
     """Handle file upload with enhanced processing including intelligent batch processing"""
     global processing_sessions
     
-    if not enhanced_processor:
+    if not wait_for_processor():
         return jsonify({
             'success': False,
             'error': 'Enhanced document processor not initialized. Please set your Claude API key in Settings.',
@@ -773,9 +788,13 @@ def not_found(e):
 @app.route('/api/health')
 def health_check():
     """Health check endpoint for monitoring"""
+    if not processor_ready.is_set():
+        processor_status = 'initializing'
+    else:
+        processor_status = 'active' if enhanced_processor else 'inactive'
     return jsonify({
         'status': 'healthy',
-        'processor_status': 'active' if enhanced_processor else 'inactive',
+        'processor_status': processor_status,
         'timestamp': time.time()
     })
 
@@ -1039,7 +1058,7 @@ def reprocess_file():
         if not file_path:
             return jsonify({'success': False, 'error': 'Missing file path'}), 400
         
-        if not enhanced_processor:
+        if not wait_for_processor():
             return jsonify({'success': False, 'error': 'Enhanced processor not available'}), 500
         
         # Security: prevent directory traversal
@@ -1381,7 +1400,7 @@ def batch_processing_config():
     """Configure batch processing settings"""
     global enhanced_processor
     
-    if not enhanced_processor:
+    if not wait_for_processor():
         return jsonify({'error': 'Enhanced processor not initialized'}), 500
     
     if request.method == 'GET':
@@ -1413,7 +1432,7 @@ def get_batch_statistics():
     """Get comprehensive batch processing statistics"""
     global enhanced_processor
     
-    if not enhanced_processor:
+    if not wait_for_processor():
         return jsonify({'error': 'Enhanced processor not initialized'}), 500
     
     try:
@@ -1463,7 +1482,7 @@ def manual_client_input():
         
         # Get the enhanced name detector
         global enhanced_processor
-        if not enhanced_processor or not enhanced_processor.name_detector:
+        if not wait_for_processor() or not enhanced_processor.name_detector:
             return jsonify({'error': 'Name detector not available'}), 500
         
         # Learn from manual input
@@ -1499,8 +1518,15 @@ def manual_client_input():
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Initialize enhanced processor on startup
-    init_enhanced_processor()
+    debug = True
+    
+    # Initialize enhanced processor on startup, in the background so the server starts accepting
+    # connections (pages, static files, /api/health) while the models load; handlers that need
+    # the processor wait for it. With the reloader this block also runs in the file-watching
+    # parent process, which never serves requests, so only the serving child loads the models.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        processor_ready.clear()
+        threading.Thread(target=init_enhanced_processor, name='processor-init', daemon=True).start()
     
     # Run the application
-    app.run(debug=True, host='0.0.0.0', port=8080) 
\ No newline at end of file
+    app.run(debug=debug, host='0.0.0.0', port=8080) 
\ No newline at end of file
@@ -8,29 +8,131 @@ import os
 import sys
 import logging
 import traceback
+import importlib.util
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Written after a successful dependency check; while it matches the interpreter, environment,
+# requirements.txt, package list and site-packages directories, the check is skipped (delete it
+# to force a re-check)
+DEPENDENCY_STAMP_FILE = '.deps_ok'
+
+class _ThreadLogBuffer(logging.Handler):
+    """
+    Single root handler that stands in for the real ones while checks run: records from threads
+    with a registered buffer are held back once each, everything else goes straight through
+    """
+    
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+        self.buffers = {}  # thread ident -> list of records
+    
+    def emit(self, record):
+        buffer = self.buffers.get(record.thread)
+        if buffer is not None:
+            buffer.append(record)
+            return
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+def _run_checks_concurrently(checks):
+    """
+    Run independent checks on a thread pool, returning (result, log records) per check in order.
+    Records are buffered rather than printed, so the output can be replayed check by check.
+    """
+    root_logger = logging.getLogger()
+    handlers = root_logger.handlers[:]
+    log_buffer = _ThreadLogBuffer(handlers)
+    for handler in handlers:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(log_buffer)
+    
+    def run(check_name, check_func):
+        records = []
+        log_buffer.buffers[threading.get_ident()] = records
+        try:
+            return check_func(), records
+        except Exception as e:
+            logger.error(f"✗ {check_name} check failed with exception: {e}")
+            return False, records
+        finally:
+            del log_buffer.buffers[threading.get_ident()]
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(checks)) as pool:
+            futures = [pool.submit(run, check_name, check_func) for check_name, check_func in checks]
+            return [future.result() for future in futures]
+    finally:
+        root_logger.removeHandler(log_buffer)
+        for handler in handlers:
+            root_logger.addHandler(handler)
+
+def _package_dir_mtimes():
+    """
+    mtime of every site-packages/dist-packages directory on sys.path. Installing or removing a
+    package adds or deletes entries there, which changes the directory's mtime, so the stamp is
+    invalidated without reading any package metadata.
+    """
+    mtimes = {}
+    for path in sys.path:
+        if os.path.basename(path) in ('site-packages', 'dist-packages'):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return mtimes
+
 def check_dependencies():
     """Check if all required dependencies are installed"""
     logger.info("Checking dependencies...")
     
-    required_packages = [
-        'torch', 'transformers', 'PIL', 'pytesseract', 'numpy',
-        'flask', 'anthropic', 'pdf2image', 'cv2'  # Changed from opencv-python to cv2
-    ]
+    # Import name -> pip distribution name, where they differ the install hint needs the latter
+    required_packages = {
+        'torch': 'torch', 'transformers': 'transformers', 'PIL': 'Pillow',
+        'pytesseract': 'pytesseract', 'numpy': 'numpy', 'flask': 'flask',
+        'anthropic': 'anthropic', 'pdf2image': 'pdf2image',
+        'cv2': 'opencv-python'
+    }
+    
+    try:
+        requirements_mtime = os.stat('requirements.txt').st_mtime_ns
+    except OSError:
+        requirements_mtime = None
+    stamp = {
+        'python': sys.version,
+        'prefix': sys.prefix,
+        'requirements_mtime_ns': requirements_mtime,
+        'packages': sorted(required_packages),
+        'package_dirs': _package_dir_mtimes()
+    }
+    try:
+        with open(DEPENDENCY_STAMP_FILE, 'r') as f:
+            if json.load(f) == stamp:
+                logger.info(f"✓ All dependencies present (cached in {DEPENDENCY_STAMP_FILE})")
+                return True
+    except (OSError, ValueError):
+        pass
     
     missing_packages = []
     
-    for package in required_packages:
+    # find_spec only locates each package, without importing it (torch/transformers take seconds)
+    for package, distribution in required_packages.items():
         try:
-            __import__(package)
+            found = importlib.util.find_spec(package) is not None
+        except (ImportError, ValueError):
+            found = False
+        if found:
             logger.info(f"✓ {package}")
-        except ImportError:
-            missing_packages.append(package)
+        else:
+            missing_packages.append(distribution)
             logger.error(f"✗ {package} - MISSING")
     
     if missing_packages:
@@ -38,6 +140,12 @@ def check_dependencies():
         logger.info("Install with: pip install " + " ".join(missing_packages))
         return False
     
+    try:
+        with open(DEPENDENCY_STAMP_FILE, 'w') as f:
+            json.dump(stamp, f)
+    except OSError as e:
+        logger.debug(f"Could not write {DEPENDENCY_STAMP_FILE}: {e}")
+    
     return True
 
 def check_tesseract():
@@ -60,17 +168,20 @@ def check_directories():
     
     directories = ['uploads', 'processed', 'models']
     
+    # One directory listing answers which of them exist, instead of a stat per directory
+    with os.scandir('.') as entries:
+        existing = {entry.name for entry in entries if entry.is_dir()}
+    
     for directory in directories:
-        path = Path(directory)
-        if path.exists():
-            if os.access(path, os.W_OK):
+        if directory in existing:
+            if os.access(directory, os.W_OK):
                 logger.info(f"✓ {directory} - exists and writable")
             else:
                 logger.error(f"✗ {directory} - exists but not writable")
                 return False
         else:
             try:
-                path.mkdir(parents=True, exist_ok=True)
+                Path(directory).mkdir(parents=True, exist_ok=True)
                 logger.info(f"✓ {directory} - created")
             except Exception as e:
                 logger.error(f"✗ {directory} - cannot create: {e}")
@@ -195,12 +306,17 @@ def run_health_check():
     logger.info("Starting DIXII Processing System Health Check...")
     logger.info("=" * 50)
     
-    checks = [
+    # Environment checks touch disjoint resources (import system, tesseract binary, directories,
+    # config, model files), so they run concurrently; their output is still shown in order
+    environment_checks = [
         ("Dependencies", check_dependencies),
         ("Tesseract", check_tesseract),
         ("Directories", check_directories),
         ("Configuration", check_config),
-        ("Model Files", check_model_files),
+        ("Model Files", check_model_files)
+    ]
+    # Component checks load the models and run one after another
+    checks = [
         ("Name Detection", test_name_detection),
         ("Document Preprocessing", test_document_preprocessing),
         ("File Processor", test_file_processor)
@@ -208,6 +324,13 @@ def run_health_check():
     
     results = {}
     
+    root_logger = logging.getLogger()
+    for (check_name, _), (result, records) in zip(environment_checks, _run_checks_concurrently(environment_checks)):
+        logger.info(f"\n--- {check_name} Check ---")
+        for record in records:
+            root_logger.handle(record)
+        results[check_name] = result
+    
     for check_name, check_func in checks:
         logger.info(f"\n--- {check_name} Check ---")
         try:
@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+import logging
+from config import Config
+
+# On-disk caches (encoded pages, API responses, page OCR, detected names) hold taxpayer data,
+# so they are opt-in (Config.DISK_CACHE_DIR), private to the user, bounded by age and size,
+# and pruned by run.py's upload cleanup so nothing outlives the uploads it came from.
+
+# Each cache directory is pruned once per this many writes, on top of the upload cleanup
+PRUNE_EVERY_WRITES = 64
+
+_prepared_dirs = set()
+_write_counts = {}
+_lock = threading.Lock()
+
+def cache_dir(name):
+    """Directory for one named cache, or None when disk caching is turned off"""
+    if not Config.DISK_CACHE_DIR:
+        return None
+    return os.path.join(os.path.abspath(os.path.expanduser(Config.DISK_CACHE_DIR)), name)
+
+def _prepare_dir(directory):
+    """Create directory and its cache root as 0700 (makedirs' mode is subject to the umask)"""
+    if directory in _prepared_dirs:
+        return
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.chmod(os.path.dirname(directory), 0o700)
+    os.chmod(directory, 0o700)
+    _prepared_dirs.add(directory)
+
+def write_cache_file(path, data):
+    """
+    Atomically write one cache entry readable only by the owner (0600).
+    Raises OSError; callers treat the disk caches as best-effort.
+    """
+    directory = os.path.dirname(path)
+    _prepare_dir(directory)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)  # Atomic, so readers never see a partial file
+
+    with _lock:
+        _write_counts[directory] = _write_counts.get(directory, 0) + 1
+        due = _write_counts[directory] % PRUNE_EVERY_WRITES == 0
+    if due:
+        prune_cache_dir(directory)
+
+def prune_cache_dir(directory, max_age_hours=None, max_bytes=None):
+    """
+    Delete entries older than max_age_hours, then the oldest entries until the directory
+    holds at most max_bytes. Defaults come from Config. Returns the number of files removed.
+    """
+    if max_age_hours is None:
+        max_age_hours = Config.DISK_CACHE_MAX_AGE_HOURS
+    if max_bytes is None:
+        max_bytes = Config.DISK_CACHE_MAX_MB * 1024 * 1024
+
+    entries = []
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                except OSError:
+                    pass
+    except OSError:
+        return 0
+
+    cutoff = time.time() - max_age_hours * 3600
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+        total -= size
+    return removed
+
+def prune_disk_caches(max_age_hours=None):
+    """Prune every cache directory under Config.DISK_CACHE_DIR (see prune_cache_dir)"""
+    root = cache_dir('')
+    if root is None:
+        return 0
+
+    removed = 0
+    try:
+        with os.scandir(root) as it:
+            directories = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return 0
+    for directory in directories:
+        removed += prune_cache_dir(directory, max_age_hours)
+    if removed:
+        logging.info(f"Pruned {removed} expired disk cache entries")
+    return removed
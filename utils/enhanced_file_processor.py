@@ -400,6 +400,11 @@ class EnhancedTaxDocumentProcessor:
         
         self.logger.info("Enhanced Tax Document Processor with Intelligent Batch Processing and Enhanced Name Detection initialized")
     
+    def close(self):
+        """Release worker processes held by the extraction components"""
+        self.claude_ocr.close()
+        self.name_detector.close()
+    
     def _initialize_processing_stats(self):
         """Initialize comprehensive processing statistics including batch processing"""
         return {
@@ -503,7 +508,8 @@ class EnhancedTaxDocumentProcessor:
         }
     
     def process_document(self, file_path: str, original_filename: str, 
-                        manual_client_info: Optional[Dict] = None) -> Dict:
+                        manual_client_info: Optional[Dict] = None,
+                        prepared: Optional[Tuple[Optional[str], Dict, List[str]]] = None) -> Dict:
         """
         Enhanced document processing with comprehensive extraction and intelligent organization
         
@@ -511,6 +517,8 @@ class EnhancedTaxDocumentProcessor:
             file_path: Path to the document file
             original_filename: Original filename
             manual_client_info: Optional manual client information
+            prepared: Optional (image_path, donut_result, temp_files) from _prepare_and_classify,
+                      when the batch pipeline has already run steps 1-2
             
         Returns:
             Comprehensive processing results
@@ -534,16 +542,17 @@ class EnhancedTaxDocumentProcessor:
         try:
             self.processing_stats['total_documents'] += 1
             
-            # Step 1: Prepare image for processing
-            image_path = self._prepare_image(file_path, temp_files)
+            # Steps 1-2: Prepare image and classify with Donut (unless the batch pipeline already did)
+            if prepared is None:
+                prepared = self._prepare_and_classify(file_path, original_filename)
+            image_path, donut_result, stage_temp_files = prepared
+            temp_files.extend(stage_temp_files)
             if not image_path:
                 result['status'] = 'error'
                 result['error'] = 'Failed to prepare image for processing'
+                self._clean_temp_files(temp_files)
                 return result
             
-            # Step 2: Document type classification (Donut specialty) - KEEP AS FIRST LINE
-            donut_result = self._classify_with_donut(image_path, original_filename)
-            
             # Step 3: Enhanced Name Detection as FIRST LINE for client/entity naming
             name_detection_results = self._apply_enhanced_name_detection(image_path, donut_result)
             
@@ -642,6 +651,27 @@ class EnhancedTaxDocumentProcessor:
             self._clean_temp_files(temp_files)
             return result
     
+    def _prepare_and_classify(self, file_path: str, original_filename: str) -> Tuple[Optional[str], Dict, List[str]]:
+        """
+        Steps 1-2 of process_document: prepare the image and classify it with Donut.
+        Split out so the batch pipeline can run it for the next document while the
+        current one is waiting on Claude.
+        
+        Returns:
+            (image_path or None on failure, donut_result, temp_files created)
+        """
+        temp_files = []
+        
+        # Step 1: Prepare image for processing
+        image_path = self._prepare_image(file_path, temp_files)
+        if not image_path:
+            return None, {}, temp_files
+        
+        # Step 2: Document type classification (Donut specialty) - KEEP AS FIRST LINE
+        donut_result = self._classify_with_donut(image_path, original_filename)
+        
+        return image_path, donut_result, temp_files
+    
     def _prepare_image(self, file_path: str, temp_files: List[str]) -> Optional[str]:
         """Enhanced file preparation - keeps PDFs as PDFs, minimizes image conversion"""
         try:
@@ -1055,11 +1085,12 @@ class EnhancedTaxDocumentProcessor:
         
         return base_plan
     
-    def _extract_client_names_claude(self, image_path: str) -> Dict:
+    def _extract_client_names_claude(self, image_path: str, img_base64: Optional[str] = None) -> Dict:
         """Extract client names using Claude's text processing expertise"""
         try:
             # Focused prompt for name extraction
-            img_base64 = self.claude_ocr.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.claude_ocr.image_to_base64(image_path)
             if not img_base64:
                 return {}
             
@@ -1089,11 +1120,12 @@ class EnhancedTaxDocumentProcessor:
             self.logger.error(f"Error in Claude name extraction: {e}")
             return {}
     
-    def _extract_amounts_fallback(self, image_path: str) -> Dict:
+    def _extract_amounts_fallback(self, image_path: str, img_base64: Optional[str] = None) -> Dict:
         """Extract amounts - fallback to Claude until Donut amount extraction is implemented"""
         try:
             # This would eventually be replaced with Donut structured data extraction
-            img_base64 = self.claude_ocr.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.claude_ocr.image_to_base64(image_path)
             if not img_base64:
                 return {}
             
@@ -1121,10 +1153,11 @@ class EnhancedTaxDocumentProcessor:
             self.logger.error(f"Error in amount extraction: {e}")
             return {}
     
-    def _extract_dates_claude(self, image_path: str) -> Dict:
+    def _extract_dates_claude(self, image_path: str, img_base64: Optional[str] = None) -> Dict:
         """Extract dates using Claude"""
         try:
-            img_base64 = self.claude_ocr.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.claude_ocr.image_to_base64(image_path)
             if not img_base64:
                 return {}
             
@@ -1152,15 +1185,18 @@ class EnhancedTaxDocumentProcessor:
             self.logger.error(f"Error in Claude date extraction: {e}")
             return {}
     
-    def _extract_dates_dual_validation(self, image_path: str) -> Dict:
+    def _extract_dates_dual_validation(self, image_path: str, img_base64: Optional[str] = None) -> Dict:
         """Extract dates with dual model validation for critical accuracy"""
         try:
+            # Both passes look at the same page - encode it once
+            if img_base64 is None:
+                img_base64 = self.claude_ocr.image_to_base64(image_path)
+            
             # Primary extraction with Claude
-            claude_dates = self._extract_dates_claude(image_path)
+            claude_dates = self._extract_dates_claude(image_path, img_base64)
             
             # Secondary validation with comprehensive extraction 
             # (In a full implementation, this could be Donut-based validation)
-            img_base64 = self.claude_ocr.image_to_base64(image_path)
             validation_prompt = """
             Verify the tax year in this document. Look carefully at:
             1. The tax year printed on the form
@@ -1192,12 +1228,13 @@ class EnhancedTaxDocumentProcessor:
             
         except Exception as e:
             self.logger.error(f"Error in dual date validation: {e}")
-            return self._extract_dates_claude(image_path)  # Fallback to single model
+            return self._extract_dates_claude(image_path, img_base64)  # Fallback to single model
     
-    def _extract_addresses_claude(self, image_path: str) -> Dict:
+    def _extract_addresses_claude(self, image_path: str, img_base64: Optional[str] = None) -> Dict:
         """Extract addresses using Claude's text processing expertise"""
         try:
-            img_base64 = self.claude_ocr.image_to_base64(image_path)
+            if img_base64 is None:
+                img_base64 = self.claude_ocr.image_to_base64(image_path)
             if not img_base64:
                 return {}
             
@@ -2632,42 +2669,12 @@ class EnhancedTaxDocumentProcessor:
         return all_results
     
     def _process_batch_group_directly(self, batch_group, session_callback=None, start_index=0) -> List[Dict]:
-        """Process a batch group directly (synchronous processing)"""
-        results = []
+        """Process a batch group directly (blocks until the whole group is done)"""
         batch_start_time = time.time()
         
         self.logger.info(f"🚀 Processing batch group with {len(batch_group.documents)} documents using {batch_group.strategy.value}")
         
-        # Process documents in the batch group
-        for i, doc in enumerate(batch_group.documents):
-            # Call progress callback if provided
-            if session_callback:
-                session_callback(start_index + i + 1, doc.original_filename)
-            try:
-                result = self.process_document(
-                    doc.file_path,
-                    doc.original_filename,
-                    doc.client_info
-                )
-                
-                # Add batch processing metadata
-                result['batch_group_id'] = batch_group.group_id
-                result['batch_strategy'] = batch_group.strategy.value
-                result['batch_size'] = len(batch_group.documents)
-                result['processing_mode'] = 'intelligent_batch'
-                result['processing_priority'] = doc.processing_priority.value
-                
-                results.append(result)
-                
-            except Exception as e:
-                self.logger.error(f"Error processing document {doc.original_filename} in batch: {e}")
-                results.append({
-                    'original_filename': doc.original_filename,
-                    'status': 'error',
-                    'error': str(e),
-                    'batch_group_id': batch_group.group_id,
-                    'processing_mode': 'intelligent_batch'
-                })
+        results = asyncio.run(self._run_batch_group_pipeline(batch_group, session_callback, start_index))
         
         batch_processing_time = time.time() - batch_start_time
         
@@ -2688,6 +2695,65 @@ class EnhancedTaxDocumentProcessor:
         
         return results
     
+    async def _run_batch_group_pipeline(self, batch_group, session_callback=None, start_index=0) -> List[Dict]:
+        """
+        Two-stage pipeline over a batch group: Donut classification of the next document
+        runs while the current one is in name detection / Claude extraction, so the
+        GPU-bound and network-bound stages overlap instead of running back to back.
+        """
+        loop = asyncio.get_running_loop()
+        classified_queue = asyncio.Queue(maxsize=1)  # Classify at most one document ahead
+        results = []
+        
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            async def classify_stage():
+                for doc in batch_group.documents:
+                    try:
+                        prepared = await loop.run_in_executor(
+                            executor, self._prepare_and_classify, doc.file_path, doc.original_filename
+                        )
+                    except Exception as e:
+                        self.logger.error(f"Error classifying document {doc.original_filename} in batch: {e}")
+                        prepared = None  # process_document will retry steps 1-2 itself
+                    await classified_queue.put((doc, prepared))
+            
+            classify_task = asyncio.create_task(classify_stage())
+            
+            for i in range(len(batch_group.documents)):
+                doc, prepared = await classified_queue.get()
+                
+                # Call progress callback if provided
+                if session_callback:
+                    session_callback(start_index + i + 1, doc.original_filename)
+                try:
+                    result = await loop.run_in_executor(
+                        executor, self.process_document,
+                        doc.file_path, doc.original_filename, doc.client_info, prepared
+                    )
+                    
+                    # Add batch processing metadata
+                    result['batch_group_id'] = batch_group.group_id
+                    result['batch_strategy'] = batch_group.strategy.value
+                    result['batch_size'] = len(batch_group.documents)
+                    result['processing_mode'] = 'intelligent_batch'
+                    result['processing_priority'] = doc.processing_priority.value
+                    
+                    results.append(result)
+                    
+                except Exception as e:
+                    self.logger.error(f"Error processing document {doc.original_filename} in batch: {e}")
+                    results.append({
+                        'original_filename': doc.original_filename,
+                        'status': 'error',
+                        'error': str(e),
+                        'batch_group_id': batch_group.group_id,
+                        'processing_mode': 'intelligent_batch'
+                    })
+            
+            await classify_task
+        
+        return results
+    
     def _estimate_batch_cost_savings(self, batch_group) -> float:
         """Estimate cost savings from batch processing"""
         # Calculate potential API call consolidation savings
@@ -2970,29 +3036,34 @@ class EnhancedTaxDocumentProcessor:
         try:
             field_results = {}
             
+            # Encode the page once and share it across every field extractor
+            img_base64 = self.claude_ocr.image_to_base64(image_path)
+            if not img_base64:
+                return {'confidence': 0.0, 'error': 'Failed to convert image'}
+            
             # Extract client names
             if routing_plan.get('client_names') == 'claude':
-                client_info = self._extract_client_names_claude(image_path)
+                client_info = self._extract_client_names_claude(image_path, img_base64)
                 field_results.update(client_info)
             
             # Extract amounts
             if routing_plan.get('amounts') == 'claude':
-                amount_info = self._extract_amounts_fallback(image_path)
+                amount_info = self._extract_amounts_fallback(image_path, img_base64)
                 field_results.update(amount_info)
             
             # Extract dates
             if routing_plan.get('dates') == 'claude':
-                date_info = self._extract_dates_claude(image_path)
+                date_info = self._extract_dates_claude(image_path, img_base64)
                 field_results.update(date_info)
             
             # Extract addresses
             if routing_plan.get('addresses') == 'claude':
-                address_info = self._extract_addresses_claude(image_path)
+                address_info = self._extract_addresses_claude(image_path, img_base64)
                 field_results.update(address_info)
             
             # Fill missing fields with comprehensive extraction
             if self._needs_comprehensive_extraction(field_results):
-                comprehensive_info = self.claude_ocr.extract_comprehensive_document_info(image_path)
+                comprehensive_info = self.claude_ocr.extract_comprehensive_document_info(image_path, img_base64=img_base64)
                 field_results = self._merge_with_comprehensive(field_results, comprehensive_info)
             
             field_results['extraction_method'] = 'individual_fields'
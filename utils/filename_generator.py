@@ -4,6 +4,14 @@ import logging
 from typing import Dict, Optional, Tuple
 from pathlib import Path
 
+# Patterns used for every generated filename, compiled once at import
+FORM_NUMBER_RE = re.compile(r'(Form\s+)?(\d{4}[A-Z]*(?:-[A-Z0-9]+)?)', re.IGNORECASE)
+SCHEDULE_RE = re.compile(r'Schedule\s+([A-Z0-9-]+)', re.IGNORECASE)
+NON_ALNUM_RE = re.compile(r'[^A-Za-z0-9 -]')
+INVALID_FILENAME_CHARS_RE = re.compile(r'[<>:"/\\|?*]')
+UNDERSCORES_RE = re.compile(r'_+')
+WHITESPACE_RE = re.compile(r'\s+')
+
 class FilenameGenerator:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -280,19 +288,19 @@ class FilenameGenerator:
                 return abbrev
         
         # Extract form numbers if present
-        form_match = re.search(r'(Form\s+)?(\d{4}[A-Z]*(?:-[A-Z0-9]+)?)', document_type, re.IGNORECASE)
+        form_match = FORM_NUMBER_RE.search(document_type)
         if form_match:
             return form_match.group(2)
         
         # Extract other recognizable patterns
         if 'schedule' in document_type.lower():
-            schedule_match = re.search(r'Schedule\s+([A-Z0-9-]+)', document_type, re.IGNORECASE)
+            schedule_match = SCHEDULE_RE.search(document_type)
             if schedule_match:
                 return f"Sch_{schedule_match.group(1)}"
         
         # Fallback to cleaned document type
-        clean_type = re.sub(r'[^A-Za-z0-9 -]', ' ', document_type)
-        clean_type = re.sub(r'\s+', ' ', clean_type).strip(' ')
+        clean_type = NON_ALNUM_RE.sub(' ', document_type)
+        clean_type = WHITESPACE_RE.sub(' ', clean_type).strip(' ')
         return clean_type[:20]  # Limit length
     
     def _get_amendment_suffix(self, extracted_info: Dict) -> str:
@@ -331,10 +339,10 @@ class FilenameGenerator:
             return 'Unknown'
         
         # Remove problematic characters
-        clean_name = re.sub(r'[<>:"/\\|?*]', '', name)
+        clean_name = INVALID_FILENAME_CHARS_RE.sub('', name)
         
         # Keep spaces instead of underscores, just clean up multiple spaces
-        clean_name = re.sub(r'\s+', ' ', clean_name)
+        clean_name = WHITESPACE_RE.sub(' ', clean_name)
         
         # Remove leading/trailing spaces
         clean_name = clean_name.strip(' ')
@@ -385,11 +393,11 @@ class FilenameGenerator:
     def _clean_filename(self, filename: str) -> str:
         """Clean filename to ensure it's valid"""
         # Remove invalid characters
-        filename = re.sub(r'[<>:"/\\|?*]', '', filename)
+        filename = INVALID_FILENAME_CHARS_RE.sub('', filename)
         
         # Clean up multiple spaces and replace underscores with spaces
-        filename = re.sub(r'_+', ' ', filename)  # Replace underscores with spaces
-        filename = re.sub(r'\s+', ' ', filename)  # Clean up multiple spaces
+        filename = UNDERSCORES_RE.sub(' ', filename)  # Replace underscores with spaces
+        filename = WHITESPACE_RE.sub(' ', filename)  # Clean up multiple spaces
         
         # Remove leading/trailing spaces and dots
         filename = filename.strip(' .')